@@ -0,0 +1,238 @@
+"""
+Times the hot paths of cards, blackjack and solitaire, along with the peak memory each one allocates.
+
+	python benchmark.py                                 Print the results
+	python benchmark.py --output results.json           Also save them as JSON
+	python benchmark.py --history history.jsonl         Also append them as one line of JSON, to track them over time
+	python benchmark.py --baseline results.json         Compare time and memory with saved results, exiting 1 on a regression
+	python benchmark.py --only deck                     Only run benchmarks with 'deck' in their name
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+import tracemalloc
+
+import cards as c
+import blackjack as b
+import solitaire as s
+import solitaire_solver
+
+
+# Every benchmark as (name, number of calls per timing, function returning the callable to time)
+BENCHMARKS = []
+
+def benchmark(name, number):
+	"""Register a function which sets up a benchmark and returns the callable to time."""
+	def register(setup):
+		BENCHMARKS.append((name, number, setup))
+		return setup
+	return register
+
+
+
+# Cards
+
+@benchmark('number_construction', 10000)
+def _number_construction():
+	return lambda: (c.Number('Ace'), c.Number(7), c.Number('queen'))
+
+@benchmark('suit_construction', 10000)
+def _suit_construction():
+	return lambda: (c.Suit('Spade'), c.Suit(2), c.Suit('hearts'))
+
+@benchmark('card_construction', 10000)
+def _card_construction():
+	return lambda: c.PlayingCard('Queen', 'Heart')
+
+@benchmark('card_comparison', 10000)
+def _card_comparison():
+	one = c.PlayingCard('Queen', 'Heart')
+	two = c.PlayingCard(7, 'Club')
+	return lambda: (one == two, one < two, one.eq_number(12), one.eq_suit('Heart'))
+
+@benchmark('card_parse', 10000)
+def _card_parse():
+	return lambda: c.PlayingCard.parse('Queen of Hearts')
+
+@benchmark('deck_fill', 1000)
+def _deck_fill():
+	return lambda: c.Deck(fill=True)
+
+@benchmark('deck_shuffle', 1000)
+def _deck_shuffle():
+	deck = c.Deck(fill=True, rng=1)
+	return deck.shuffle
+
+@benchmark('deck_deal_and_gather', 1000)
+def _deck_deal_and_gather():
+	deck = c.Deck(fill=True, rng=1)
+	def run():
+		for pile in deck.deal(deck_count=4):
+			pile.transfer_to(deck)
+	return run
+
+@benchmark('deck_draw_52', 1000)
+def _deck_draw_52():
+	deck = c.Deck(fill=True)
+	def run():
+		drawn = [deck.draw() for i in range(52)]
+		deck.add_many(drawn)
+	return run
+
+@benchmark('pile_iadd', 1000)
+def _pile_iadd():
+	cards = list(c.Deck(fill=True))
+	def run():
+		pile = c.Pile(cards[:26])
+		pile += c.Pile(cards[26:])
+	return run
+
+@benchmark('pile_sub', 1000)
+def _pile_sub():
+	deck = c.Deck(fill=True)
+	known = list(deck)[10:15]
+	def run():
+		removed = deck - c.Pile(known)
+		deck.add_many(removed)
+	return run
+
+@benchmark('hand_value_blackjack', 10000)
+def _hand_value_blackjack():
+	cards = [c.PlayingCard('Ace', 'Spade'), c.PlayingCard(6, 'Heart'), c.PlayingCard('King', 'Club')]
+	return lambda: c.Hand(cards, evaluate=b.hand_value).value()
+
+
+
+# Solitaire
+
+@benchmark('tableau_setup', 200)
+def _tableau_setup():
+	return lambda: s.Tableau(c.Deck(fill=True, rng=1))
+
+@benchmark('tableau_render', 1000)
+def _tableau_render():
+	return s.Table(rng=1).__str__
+
+def play_solitaire(seed, max_moves=300):
+	"""Play the deal of seed greedily, preferring moves to the foundations, then the tableau, then the stock."""
+	table = s.Table(rng=seed)
+	for i in range(max_moves):
+		moves = s.legal_moves(table)
+		if not moves or table.won():
+			break
+		moves.sort(key=lambda move: (move.destination != s.FOUNDATION, move.source == s.STOCK))
+		s.apply(table, moves[0])
+	return table
+
+@benchmark('solitaire_game', 5)
+def _solitaire_game():
+	return lambda: play_solitaire(1)
+
+@benchmark('solitaire_solve', 5)
+def _solitaire_solve():
+	table = s.Table(rng=2)
+	return lambda: solitaire_solver.solve(table)
+
+
+
+# Blackjack
+
+@benchmark('blackjack_round', 1000)
+def _blackjack_round():
+	table = b.BlackjackTable(rng=1)
+	strategies = [b.mimic_dealer] * 3
+	return lambda: table.play_round(strategies)
+
+
+
+# Running
+
+def run(names=None, repeat=5):
+	"""Run the benchmarks with any of names in their name, or all of them, and return their results as a dict."""
+	results = {}
+	for name, number, setup in BENCHMARKS:
+		if names and not any([part in name for part in names]):
+			continue
+
+		call = setup()
+		seconds = min(timeit.repeat(call, number=number, repeat=repeat)) / number
+
+		tracemalloc.start()
+		call()
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+		results[name] = {'seconds': seconds, 'peak_bytes': peak, 'number': number}
+
+	return {'time': time.time(), 'python': platform.python_version(), 'results': results}
+
+def compare(results, baseline, tolerance, memory_tolerance=0.1):
+	"""
+	Return the names of the benchmarks which took more than 1 + tolerance times as long as in baseline,
+	or whose peak memory was more than 1 + memory_tolerance times as much.
+	"""
+	regressions = []
+	for name, result in results['results'].items():
+		before = baseline['results'].get(name)
+		if before and (result['seconds'] > before['seconds'] * (1 + tolerance) or
+			result['peak_bytes'] > before['peak_bytes'] * (1 + memory_tolerance)):
+			regressions.append(name)
+	return regressions
+
+def _change(now, before):
+	return ('%+.1f%%' % ((now / before - 1) * 100)) if before else 'n/a'
+
+def report(results, baseline=None):
+	"""Return a table of the results, with the change in time and peak memory from baseline if one is given."""
+	lines = []
+	for name, result in results['results'].items():
+		line = name.ljust(24) + ('%.3f us' % (result['seconds'] * 1e6)).rjust(16) + \
+			(str(result['peak_bytes']) + ' B').rjust(14)
+		if baseline and name in baseline['results']:
+			before = baseline['results'][name]
+			line += _change(result['seconds'], before['seconds']).rjust(10) + \
+				_change(result['peak_bytes'], before['peak_bytes']).rjust(10)
+		lines.append(line)
+	return '\n'.join(lines)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmark cards, blackjack and solitaire.')
+	parser.add_argument('--output', help='save the results to this JSON file')
+	parser.add_argument('--history', help='append the results to this file of JSON lines')
+	parser.add_argument('--baseline', help='compare against results saved with --output')
+	parser.add_argument('--tolerance', type=float, default=0.2, help='slowdown allowed before failing (default 0.2)')
+	parser.add_argument('--memory-tolerance', type=float, default=0.1,
+		help='growth in peak memory allowed before failing (default 0.1)')
+	parser.add_argument('--repeat', type=int, default=5, help='timings taken of each benchmark (default 5)')
+	parser.add_argument('--only', nargs='*', help='only run benchmarks with one of these in their name')
+	args = parser.parse_args()
+
+	results = run(args.only, args.repeat)
+	baseline = None
+	if args.baseline:
+		with open(args.baseline) as baseline_file:
+			baseline = json.load(baseline_file)
+
+	print(report(results, baseline))
+
+	if args.output:
+		with open(args.output, 'w') as output:
+			json.dump(results, output, indent=1)
+	if args.history:
+		with open(args.history, 'a') as history:
+			history.write(json.dumps(results) + '\n')
+
+	if baseline:
+		regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+		if regressions:
+			print('\nRegressed: ' + ', '.join(regressions))
+			sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -1,5 +1,8 @@
 import cards as c
 import os
+from collections import namedtuple
+from functools import lru_cache
+from multiprocessing import Pool, cpu_count
 
 def clear():
 	os.system('clear')
@@ -8,227 +11,534 @@ def wait():
 	input('\nPress enter to continue...')
 	clear()
 
-def hand_value(cards):
-	value = 0
-	aces = []
-	for card in cards:
-		if int(card) == 1:
-			aces.append(card)
-		else:
-			value += min(int(card), 10)
-
-	for i, ace in enumerate(aces):
-		if value <= 21 - (len(aces) - i - 1) - 11:
-			value += 11
-		else:
-			value += 1
+class BlackjackValue(c.IncrementalEvaluator):
+	"""
+	Values cards by blackjack rules: face cards are worth 10, and one ace is worth 11 if that doesn't bust.
+	Its state is the hand's total counting every ace as 1, and whether the hand has an ace.
+	"""
+
+	def start(self):
+		return (0, 0)
+	def add(self, state, card):
+		number = int(card)
+		return (state[0] + min(number, 10), state[1] + (number == 1))
+	def remove(self, state, card):
+		number = int(card)
+		return (state[0] - min(number, 10), state[1] - (number == 1))
+	def value(self, state):
+		total, aces = state
+		if aces and total <= 11:
+			return total + 10
+		return total
+
+hand_value = BlackjackValue()
+
+
+
+# Rules
+
+# The value recorded for a hand which has gone over 21
+BUST = 0
+
+def dealer_hits(value):
+	"""The house rule for the dealer: keep hitting until the hand is worth more than 16."""
+	return value <= 16
+
+def mimic_dealer(hand, up_card):
+	"""A player strategy which plays by the dealer's rule."""
+	return dealer_hits(hand.value())
+
+def update_hold(hand):
+	"""
+	Record hand's value in hand['value'] and hold it if it has busted or hit 21.
+	Return the hand's actual value.
+	"""
+	value = hand.value()
+	if value > 21:
+		hand['hold'] = True
+		hand['value'] = BUST
+	elif value == 21:
+		hand['hold'] = True
+		hand['value'] = 21
+	else:
+		hand['value'] = value
 
 	return value
 
+def settle(value, dealer_value, push_on_tie=False):
+	"""
+	Return 'win', 'loss' or 'push' for a player's final value against the dealer's, with busted hands worth BUST.
+	Big Blackjack gives ties to the player unless push_on_tie.
+	"""
+	if value > dealer_value or (value == dealer_value and not push_on_tie):
+		return 'win'
+	if value == dealer_value:
+		return 'push'
+	return 'loss'
+
+
+
+# Engine
+
+RoundResult = namedtuple('RoundResult', ['name', 'bet', 'value', 'dealer_value', 'outcome', 'payout'])
+RoundResult.__doc__ = """
+The outcome of one player's hand. value and dealer_value are BUST for busted hands,
+outcome is 'win', 'loss' or 'push', and payout is the player's winnings (negative for a loss).
+"""
+
+
+class BlackjackTable():
+	"""
+	Plays rounds of Big Blackjack without any input or output.
+
+	Each round follows the interactive game: everyone is dealt two cards, then the players who haven't held
+	take a turn each, followed by the dealer, until everyone has held. The cards are then gathered back into
+	the deck and it is reshuffled. If the deck is a Shoe, the cards are discarded instead, and the shoe is only
+	reshuffled at the start of a round once the cut card has come out.
+
+	Player strategies are callables taking the player's hand and the dealer's face up card, which return
+	True to hit or False to hold. Players automatically hold once they bust or hit 21.
+
+	Attributes:
+		deck (Deck): The deck the cards are dealt from.
+		dealer (OrderedHand): The dealer's hand.
+		dealer_rule (callable): Takes the dealer's hand value and returns whether the dealer hits.
+		push_on_tie (bool): Whether a tie is a push instead of a win for the player.
+		players (list): The players' hands, reused from round to round.
+	"""
+
+	def __init__(self, deck=None, dealer_rule=dealer_hits, push_on_tie=False, rng=None):
+		if deck is None:
+			deck = c.Deck(fill=True, rng=rng)
+
+		self.deck = deck
+		self.deck.shuffle()
+		self.dealer = c.OrderedHand(name='The Dealer', evaluate=hand_value)
+		self.dealer_rule = dealer_rule
+		self.push_on_tie = push_on_tie
+		self.players = []
+
+	def __repr__(self):
+		return '<BlackjackTable deck:' + repr(self.deck) + ', dealer_rule:' + str(self.dealer_rule) + \
+			', push_on_tie:' + str(self.push_on_tie) + '>'
+
+	def play_round(self, strategies, bets=None):
+		"""
+		Play a round with one player per strategy and return a list of their RoundResults.
+		bets holds each player's bet, which defaults to 1.
+		"""
+		if bets is None:
+			bets = [1] * len(strategies)
+		if isinstance(self.deck, c.Shoe):
+			self.deck.shuffle_if_needed()
+
+		while len(self.players) < len(strategies):
+			self.players.append(c.OrderedHand(name='Player ' + str(len(self.players) + 1), evaluate=hand_value))
+		players = self.players[:len(strategies)]
+		dealer = self.dealer
+
+		self.deck.deal(piles=players + [dealer], card_count=2)
+		# The first card dealt to the dealer is their hole card
+		up_card = dealer[0]
+
+		values = [0] * len(players)
+		holding = [False] * len(players)
+		dealer_value = 0
+		dealer_holding = False
+
+		while not (dealer_holding and all(holding)):
+			for i, player in enumerate(players):
+				if holding[i]:
+					continue
+
+				value = player.value()
+				if value >= 21:
+					holding[i] = True
+				elif strategies[i](player, up_card):
+					player.add(self.deck.draw())
+					value = player.value()
+					holding[i] = value >= 21
+				else:
+					holding[i] = True
+				values[i] = value
 
+			if not dealer_holding:
+				dealer_value = dealer.value()
+				dealer_holding = dealer_value >= 21 or not self.dealer_rule(dealer_value)
 
-# Game setup
+				if not dealer_holding:
+					dealer.add(self.deck.draw())
+					dealer_value = dealer.value()
+					dealer_holding = dealer_value >= 21
 
-deck = c.Deck(fill=True)
-deck.shuffle()
+		if dealer_value > 21:
+			dealer_value = BUST
 
-print('Welcome to Big Blackjack!')
-print('We hope you enjoy your time.\n')
+		results = []
+		for player, value, bet in zip(players, values, bets):
+			if value > 21:
+				value = BUST
+			outcome = settle(value, dealer_value, self.push_on_tie)
+			payout = bet if outcome == 'win' else -bet if outcome == 'loss' else 0
+			results.append(RoundResult(player['name'], bet, value, dealer_value, outcome, payout))
+
+		if isinstance(self.deck, c.Shoe):
+			for hand in players:
+				self.deck.discard(hand)
+			self.deck.discard(dealer)
+		else:
+			for hand in players:
+				hand.transfer_to(self.deck)
+			dealer.transfer_to(self.deck)
+			self.deck.shuffle()
+
+		return results
+
+
+
+# Exact dealer odds
+
+def dealer_outcomes(up_card, composition, dealer_rule=dealer_hits):
+	"""
+	Return the exact probability of each final dealer total as a dict, with busting under BUST.
+
+	up_card is the dealer's up card (anything int() gives the number of), and composition is what's left to draw
+	from: either a Pile of cards or a sequence of counts indexed by Number. The dealer draws until dealer_rule
+	says to hold, they reach 21 or they bust, and holds on whatever they have if the cards run out.
+	Results are memoized on the remaining composition, so repeated and overlapping queries are instant.
+	"""
+	if isinstance(composition, c.Pile):
+		counts = [0] * 14
+		for card in composition:
+			counts[int(card)] += 1
+		composition = counts
+
+	# Jokers, Aces to Nines, then every card worth 10
+	counts = list(composition[:10]) + [0] * (10 - len(composition[:10]))
+	counts.append(sum(composition[10:]))
+
+	number = int(up_card)
+	value = min(number, 10)
+	return dict(_dealer_totals(value, number == 1, tuple(counts), dealer_rule))
+
+@lru_cache(maxsize=1 << 20)
+def _dealer_totals(total, soft, counts, dealer_rule):
+	"""
+	Return (final total, probability) pairs for a dealer hand with total (counting aces as 1) and an ace if soft,
+	drawing from counts of each blackjack value.
+	"""
+	value = total + 10 if soft and total <= 11 else total
+	if value > 21:
+		return ((BUST, 1.0),)
+
+	remaining = sum(counts)
+	if value >= 21 or not dealer_rule(value) or remaining == 0:
+		return ((value, 1.0),)
+
+	outcomes = {}
+	for card_value, count in enumerate(counts):
+		if count == 0:
+			continue
+
+		drawn = counts[:card_value] + (count - 1,) + counts[card_value + 1:]
+		chance = count / remaining
+		for final, probability in _dealer_totals(total + card_value, soft or card_value == 1, drawn, dealer_rule):
+			outcomes[final] = outcomes.get(final, 0.0) + chance * probability
+
+	return tuple(sorted(outcomes.items()))
+
+
+
+# Simulation
+
+class Tally():
+	"""
+	Running totals over the RoundResults of many rounds, which can be merged with other Tallys.
+
+	Attributes:
+		rounds (int): The number of rounds played.
+		hands (int): The number of player hands played.
+		wins (int): The number of player hands won.
+		losses (int): The number of player hands lost.
+		pushes (int): The number of player hands pushed.
+		busts (int): The number of player hands which busted.
+		dealer_busts (int): The number of rounds in which the dealer busted.
+		wagered (int): The total of all bets.
+		payout (int): The total of all payouts.
+	"""
+
+	FIELDS = ('rounds', 'hands', 'wins', 'losses', 'pushes', 'busts', 'dealer_busts', 'wagered', 'payout')
+
+	def __init__(self):
+		for field in Tally.FIELDS:
+			setattr(self, field, 0)
+
+	def __repr__(self):
+		return '<Tally ' + ', '.join(field + ':' + str(getattr(self, field)) for field in Tally.FIELDS) + '>'
+
+	def add_round(self, results):
+		"""Count the RoundResults of one round."""
+		self.rounds += 1
+		if results and results[0].dealer_value == BUST:
+			self.dealer_busts += 1
+
+		for result in results:
+			self.hands += 1
+			if result.outcome == 'win':
+				self.wins += 1
+			elif result.outcome == 'loss':
+				self.losses += 1
+			else:
+				self.pushes += 1
+			if result.value == BUST:
+				self.busts += 1
+			self.wagered += result.bet
+			self.payout += result.payout
+
+	def __iadd__(self, other):
+		for field in Tally.FIELDS:
+			setattr(self, field, getattr(self, field) + getattr(other, field))
+		return self
+
+	def ev(self):
+		"""Return the expected payout per unit bet."""
+		return self.payout / self.wagered if self.wagered else 0.0
+	def report(self):
+		"""Return the totals along with win, loss, push and bust rates and the EV as a dict."""
+		report = {field: getattr(self, field) for field in Tally.FIELDS}
+		hands = self.hands or 1
+		report['win_rate'] = self.wins / hands
+		report['loss_rate'] = self.losses / hands
+		report['push_rate'] = self.pushes / hands
+		report['bust_rate'] = self.busts / hands
+		report['dealer_bust_rate'] = self.dealer_busts / (self.rounds or 1)
+		report['ev'] = self.ev()
+		return report
+
+
+def _simulate_shard(args):
+	"""Play a shard of a simulation on a table of its own and return its Tally."""
+	rounds, strategies, seed, push_on_tie, decks, penetration = args
+
+	deck = c.Shoe(decks, penetration, rng=seed) if decks else None
+	table = BlackjackTable(deck, push_on_tie=push_on_tie, rng=seed)
+	tally = Tally()
+	for i in range(rounds):
+		tally.add_round(table.play_round(strategies))
+
+	return tally
+
+def simulate(rounds, strategies=(mimic_dealer,), workers=None, seed=None, push_on_tie=False, decks=None,
+		penetration=0.75):
+	"""
+	Play rounds rounds of blackjack split across a pool of worker processes and return the merged Tally.
+
+	Every worker gets its own table, deck and random stream spawned from seed, so a simulation with the same
+	seed and number of workers is reproducible. strategies are the player strategies seated at each table and
+	must be picklable, i.e. module level functions. workers defaults to the number of CPUs.
+	Each worker deals from a single deck reshuffled every round, or from a Shoe of decks decks cut at penetration.
+	"""
+	if workers is None:
+		workers = cpu_count()
+	workers = max(1, min(workers, rounds))
+
+	seeds = c.spawn_seeds(seed, workers)
+	shards = [(rounds // workers + (i < rounds % workers), list(strategies), seeds[i], push_on_tie, decks, penetration)
+		for i in range(workers)]
+
+	if workers == 1:
+		tallies = [_simulate_shard(shards[0])]
+	else:
+		with Pool(workers) as pool:
+			tallies = pool.map(_simulate_shard, shards, chunksize=1)
+
+	total = Tally()
+	for tally in tallies:
+		total += tally
+	return total
+
+
+
+# Interactive game
+
+def main():
+	# Game setup
+
+	deck = c.Deck(fill=True)
+	deck.shuffle()
 
-player_count = 0
-while player_count == 0:
-	try:
-		player_count = int(input('How many players will be joining us: '))
-		if player_count < 1:
-			print('At least one player is required.')
-			player_count = 0
-	except ValueError:
-		print('Enter a number please.')
+	print('Welcome to Big Blackjack!')
+	print('We hope you enjoy your time.\n')
 
-players = []
-for i in range(player_count):
-	name = input('Enter player ' + str(i+1) + '\'s name: ')
-	players.append(c.OrderedHand(evaluate=hand_value, name=name, money=100))
+	player_count = 0
+	while player_count == 0:
+		try:
+			player_count = int(input('How many players will be joining us: '))
+			if player_count < 1:
+				print('At least one player is required.')
+				player_count = 0
+		except ValueError:
+			print('Enter a number please.')
 
-dealer = c.OrderedHand(name='The Dealer', evaluate=hand_value, hold=False)
+	players = []
+	for i in range(player_count):
+		name = input('Enter player ' + str(i+1) + '\'s name: ')
+		players.append(c.OrderedHand(evaluate=hand_value, name=name, money=100))
 
-clear()
-print('The dealer has arrived!')
-print('They look awfully confident.')
-print('Think you can outwit them?\n')
-input('Press enter to begin...')
-clear()
+	dealer = c.OrderedHand(name='The Dealer', evaluate=hand_value, hold=False)
 
+	clear()
+	print('The dealer has arrived!')
+	print('They look awfully confident.')
+	print('Think you can outwit them?\n')
+	input('Press enter to begin...')
+	clear()
 
 
-# Game loop
 
-while len(players) > 0:
-	everyone = players + [dealer]
+	# Game loop
 
-	for player in players:
-		print(str(player['name']) + ' has $' + str(player['money']))
+	while len(players) > 0:
+		everyone = players + [dealer]
 
-	wait()
+		for player in players:
+			print(str(player['name']) + ' has $' + str(player['money']))
 
-	# Betting loop
-	for player in players:
-		bet = 0
-		while bet == 0:
-			try:
-				bet = int(input('How much will ' + player['name'] + ' bet: '))
-				if bet > player['money']:
-					print('You must have enough money to cover the bet.')
-					bet = 0
-				elif bet < 1:
-					print('The bet must be at least $1.')
-					bet = 0
-			except ValueError:
-				print('Enter a number please.')
-		player['bet'] = bet
-		player['value'] = 0
-		player['hold'] = False
+		wait()
 
-	wait()
+		# Betting loop
+		for player in players:
+			bet = 0
+			while bet == 0:
+				try:
+					bet = int(input('How much will ' + player['name'] + ' bet: '))
+					if bet > player['money']:
+						print('You must have enough money to cover the bet.')
+						bet = 0
+					elif bet < 1:
+						print('The bet must be at least $1.')
+						bet = 0
+				except ValueError:
+					print('Enter a number please.')
+			player['bet'] = bet
+			player['value'] = 0
+			player['hold'] = False
 
-	deck.deal(piles=everyone, card_count=2)
-	for player in everyone:
-		player[-1].flip()
+		wait()
 
-	# Hand loop
-	while not all([player['hold'] for player in everyone]):
+		deck.deal(piles=everyone, card_count=2)
+		for player in everyone:
+			player[-1].flip()
 
-		# Player loop
-		for player in [player for player in players if not player['hold']]:
-			print('It is', player['name'] + '\'s turn!')
-			wait()
+		# Hand loop
+		while not all([player['hold'] for player in everyone]):
 
-			for p in everyone:
-				print(str(p) + (' - HOLD' if p['hold'] else ''))
+			# Player loop
+			for player in [player for player in players if not player['hold']]:
+				print('It is', player['name'] + '\'s turn!')
+				wait()
 
-			print()
-			print(player.view())
-			print()
+				for p in everyone:
+					print(str(p) + (' - HOLD' if p['hold'] else ''))
 
-			value = player.value()
-			if value > 21:
-				print('You\'ve busted! Bummer.')
-				player['hold'] = True
-				player['value'] = 0
-			elif value == 21:
-				print('You\'ve hit 21! Nice!')
-				player['hold'] = True
-				player['value'] = 21
-			else:
-				player['value'] = value
-
-			if not player['hold']:
-				player['hold'] = None
-				while player['hold'] == None:
-					choice = input('HIT or HOLD: ')
-					if choice.upper() == 'HIT':
-						player['hold'] = False
-					elif choice.upper() == 'HOLD':
-						player['hold'] = True
-					else:
-						print('Enter HIT or HOLD please.')
-			print()
-
-			if not player['hold']:
-				player.add(deck.draw())
+				print()
 				print(player.view())
-				value = player.value()
+				print()
+
+				value = update_hold(player)
 				if value > 21:
 					print('You\'ve busted! Bummer.')
-					player['hold'] = True
-					player['value'] = 0
 				elif value == 21:
 					print('You\'ve hit 21! Nice!')
-					player['hold'] = True
-					player['value'] = 21
-				else:
-					player['value'] = value
 
-			wait()
+				if not player['hold']:
+					player['hold'] = None
+					while player['hold'] == None:
+						choice = input('HIT or HOLD: ')
+						if choice.upper() == 'HIT':
+							player['hold'] = False
+						elif choice.upper() == 'HOLD':
+							player['hold'] = True
+						else:
+							print('Enter HIT or HOLD please.')
+				print()
+
+				if not player['hold']:
+					player.add(deck.draw())
+					print(player.view())
+					value = update_hold(player)
+					if value > 21:
+						print('You\'ve busted! Bummer.')
+					elif value == 21:
+						print('You\'ve hit 21! Nice!')
+
+				wait()
+
+			# Dealer's turn
+			if not dealer['hold']:
+				print('It\'s the dealer\'s turn!')
+				wait()
 
-		# Dealer's turn
-		if not dealer['hold']:
-			print('It\'s the dealer\'s turn!')
-			wait()
+				print('The dealer is playing...\n')
 
-			print('The dealer is playing...\n')
+				for player in everyone:
+					print(str(player) + (' - HOLD' if player['hold'] else ''))
+				print()
 
-			for player in everyone:
-				print(str(player) + (' - HOLD' if player['hold'] else ''))
-			print()
+				value = update_hold(dealer)
+				if not dealer['hold']:
+					dealer['hold'] = not dealer_hits(value)
 
-			value = dealer.value()
-			if value > 21:
-				dealer['value'] = 0
-				dealer['hold'] = True
-			elif value == 21:
-				dealer['value'] = 21
-				dealer['hold'] = True
-			else:
-				dealer['value'] = value
+				if dealer['hold']:
+					print('The dealer HOLDs.')
+				else:
+					print('The dealer HITs.')
+				print()
 
-			if not dealer['hold']:
-				dealer['hold'] = value > 16
+				if not dealer['hold']:
+					dealer.add(deck.draw())
+					print(dealer)
+					update_hold(dealer)
 
-			if dealer['hold']:
-				print('The dealer HOLDs.')
-			else:
-				print('The dealer HITs.')
-			print()
+				wait()
 
-			if not dealer['hold']:
-				dealer.add(deck.draw())
-				print(dealer)
-				value = dealer.value()
-				if value > 21:
-					dealer['value'] = 0
-					dealer['hold'] = True
-				elif value == 21:
-					dealer['value'] = 21
-					dealer['hold'] = True
-				else:
-					dealer['value'] = value
+		# Hand wrap-up
 
-			wait()
+		print('Everyone has held')
+		wait()
+		dealer['hold'] = False
 
-	# Hand wrap-up
+		for player in everyone:
+			player.flip_face_up()
+			print(player)
+			player.transfer_to(deck)
+		deck.shuffle()
 
-	print('Everyone has held')
-	wait()
-	dealer['hold'] = False
+		print()
+		losers = []
+		for player in players:
+			if settle(player['value'], dealer['value']) == 'win':
+				print(str(player['name']) + ' won $' + str(player['bet']) + '!')
+				player['money'] += player['bet']
 
-	for player in everyone:
-		player.flip_face_up()
-		print(player)
-		deck += player
-	deck.shuffle()
+			else:
+				print(str(player['name']) + ' lost $' + str(player['bet']) + '.')
+				player['money'] -= player['bet']
 
-	print()
-	losers = []
-	for player in players:
-		if player['value'] >= dealer['value']:
-			print(str(player['name']) + ' won $' + str(player['bet']) + '!')
-			player['money'] += player['bet']
+				if player['money'] < 1:
+					print(str(player['name']) + ' has lost! Oh no!')
+					losers.append(player)
 
-		else:
-			print(str(player['name']) + ' lost $' + str(player['bet']) + '.')
-			player['money'] -= player['bet']
 
-			if player['money'] < 1:
-				print(str(player['name']) + ' has lost! Oh no!')
-				losers.append(player)
+		for loser in losers:
+			players.remove(loser)
 
+		wait()
 
-	for loser in losers:
-		players.remove(loser)
+	print('We hope you have enjoyed Big Blackjack!')
+	print('Come again soon <3')
+	print()
 
-	wait()
 
-print('We hope you have enjoyed Big Blackjack!')
-print('Come again soon <3')
-print()
\ No newline at end of file
+if __name__ == '__main__':
+	main()
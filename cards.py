@@ -2,7 +2,14 @@
 Used to create and manipulate playing cards as well as data structures associated with them.
 """
 
-from random import shuffle, choice
+import json
+import random
+import sys
+import time
+from array import array
+from collections import namedtuple
+from hashlib import sha256
+from itertools import islice
 
 
 
@@ -38,10 +45,13 @@ class Card():
 		self.face_one_up = turned_up
 	def eq_face_one(self, other):
 		"""Return face_one == other"""
-		return face_one == other
+		return self.face_one == other
 	def eq_face_two(self, other):
 		"""Return face_two == other"""
-		return face_two == other
+		return self.face_two == other
+	def eq_facing(self, other):
+		"""Return whether other is the same card and turned the same way up."""
+		return self == other and self.face_one_up == other.face_one_up
 	def copy(self):
 		"""Return a copy of the card."""
 		return Card(self.face_one.copy(), self.face_two.copy(), self.face_one_up)
@@ -51,78 +61,64 @@ class Card():
 	def __repr__(self):
 		return '<Card face_one:' + str(self.face_one) + ', face_two:' + str(self.face_two) + ', face_one_up:' + str(self.face_one_up) + '>'
 
-	# Performed on the turned up face
+	# Cards are equal when they have the same faces, whichever way up they are.
+	# A PlayingCard hashes by its code, so it is never equal to a plain Card.
+	# Anything else, like a str, is compared with the turned up face.
 	def __eq__(self, other):
+		if isinstance(other, Card):
+			if isinstance(self, PlayingCard) != isinstance(other, PlayingCard):
+				return False
+			return self.face_one == other.face_one and self.face_two == other.face_two
 		return str(self) == str(other)
 	def __ne__(self, other):
-		return str(self) != str(other)
+		return not self == other
 	def __hash__(self):
-		return hash((self.face_one, self.face_two, self.face_one_up))
+		return hash((self.face_one, self.face_two))
 
 
 class Number():
 	"""
 	Represents the number or face of a playing card.
 
+	Numbers are interned: constructing a Number returns one of the 14 shared instances in NUMBERS,
+	so they are immutable and can be compared by identity.
+
 	Attributes:
 		name (str): String representation of the Number
 		num (int): Integer representation of the Number
 	"""
 
-	def __init__(self, new_num):
-		number = str(new_num).upper()
-		
-		if number in {"ACE", "ONE", "1", "A"}:
-			self.name = "Ace"
-			self.num = 1
-		elif number in {"TWO", "2"}:
-			self.name = "Two"
-			self.num = 2
-		elif number in {"THREE", "3"}:
-			self.name = "Three"
-			self.num = 3
-		elif number in {"FOUR", "4"}:
-			self.name = "Four"
-			self.num = 4
-		elif number in {"FIVE", "5"}:
-			self.name = "Five"
-			self.num = 5
-		elif number in {"SIX", "6"}:
-			self.name = "Six"
-			self.num = 6
-		elif number in {"SEVEN", "7"}:
-			self.name = "Seven"
-			self.num = 7
-		elif number in {"EIGHT", "8"}:
-			self.name = "Eight"
-			self.num = 8
-		elif number in {"NINE", "9"}:
-			self.name = "Nine"
-			self.num = 9
-		elif number in {"TEN", "10"}:
-			self.name = "Ten"
-			self.num = 10
-		elif number in {"JACK", "ELEVEN", "11", "J"}:
-			self.name = "Jack"
-			self.num = 11
-		elif number in {"QUEEN", "TWELVE", "12", "Q"}:
-			self.name = "Queen"
-			self.num = 12
-		elif number in {"KING", "THIRTEEN", "13", "K"}:
-			self.name = "King"
-			self.num = 13
-		elif number in {"JOKER", "FOURTEEN", "ZERO", "14", "0"}:
-			self.name = "Joker"
-			self.num = 0
-		else:
+	__slots__ = ('name', 'num')
+
+	def __new__(cls, new_num):
+		if type(new_num) is Number:
+			return new_num
+
+		number = _NUMBER_LOOKUP.get(new_num if type(new_num) is int else str(new_num).upper())
+		if number is None:
 			raise ValueError('Number can\'t be created from', new_num)
+		return number
+
+	@classmethod
+	def _create(cls, name, num):
+		number = object.__new__(cls)
+		object.__setattr__(number, 'name', name)
+		object.__setattr__(number, 'num', num)
+		return number
 
 	def is_face_card(self):
 		"""Returns whether the number is a face card."""
-		return int(self) > 10
+		return self.num > 10
 	def copy(self):
-		"""Returns a copy of the Number."""
-		return Number(self)
+		"""Returns a copy of the Number (Numbers are immutable, so this is the Number itself)."""
+		return self
+
+	def __setattr__(self, name, value):
+		raise AttributeError('Number objects are immutable')
+	def __delattr__(self, name):
+		raise AttributeError('Number objects are immutable')
+	def __reduce__(self):
+		return (Number, (self.num,))
 
 	def __str__(self):
 		return self.name
@@ -133,17 +129,17 @@ class Number():
 		return '<Number name:' + str(self.name) + ', num:' + str(self.num) + '>'
 
 	def __eq__(self, other):
-		return int(self) == int(Number(other))
+		return self is _as_number(other)
 	def __ne__(self, other):
-		return int(self) != int(Number(other))
+		return self is not _as_number(other)
 	def __le__(self, other):
-		return int(self) <= int(Number(other))
+		return self.num <= _as_number(other).num
 	def __lt__(self, other):
-		return int(self) < int(Number(other))
+		return self.num < _as_number(other).num
 	def __gt__(self, other):
-		return int(self) > int(Number(other))
+		return self.num > _as_number(other).num
 	def __ge__(self, other):
-		return int(self) >= int(Number(other))
+		return self.num >= _as_number(other).num
 	def __add__(self, other):
 		"""
 		If other is a Suit or str, return a string representing the combination of number and suit.
@@ -153,44 +149,53 @@ class Number():
 			return str(self) + ' of ' + str(Suit(other)) + 's'
 		return int(self) + int(other)
 	def __hash__(self):
-		return hash(int(self))
+		return hash(self.num)
 
 
 class Suit():
 	"""
 	Represents the suit of a playing card.
 
+	Suits are interned: constructing a Suit returns one of the 4 shared instances in SUITS,
+	so they are immutable and can be compared by identity.
+
 	Attributes:
 		suit (str): String repreesntation of the Suit.
 		num (int): Integer representation of the Suit.
 	"""
 
-	def __init__(self, new_suit):
-		suit = str(new_suit).upper()
-		
-		if suit in {"HEART", "HEARTS", "0", "ZERO", "H"}:
-			self.suit = "Heart"
-			self.num = 0
-		elif suit in {"CLUB", "CLUBS", "1", "ONE", "C"}:
-			self.suit = "Club"
-			self.num = 1
-		elif suit in {"DIAMOND", "DIAMONDS", "2", "TWO", "D"}:
-			self.suit = "Diamond"
-			self.num = 2
-		elif suit in {"SPADE", "SPADES", "3", "THREE", "S"}:
-			self.suit = "Spade"
-			self.num = 3
-		else:
+	__slots__ = ('suit', 'num', '_color')
+
+	def __new__(cls, new_suit):
+		if type(new_suit) is Suit:
+			return new_suit
+
+		suit = _SUIT_LOOKUP.get(new_suit if type(new_suit) is int else str(new_suit).upper())
+		if suit is None:
 			raise ValueError('Suit can\'t be created from',new_suit)
+		return suit
+
+	@classmethod
+	def _create(cls, name, num):
+		suit = object.__new__(cls)
+		object.__setattr__(suit, 'suit', name)
+		object.__setattr__(suit, 'num', num)
+		object.__setattr__(suit, '_color', 'Red' if num%2 == 0 else 'Black')
+		return suit
 
 	def get_color(self):
 		"""Return the color (str) associated with this suit."""
-		if int(self)%2 == 0:
-			return 'Red'
-		return 'Black'
+		return self._color
 	def copy(self):
-		"""Return a copy of this suit."""
-		return Suit(self)
+		"""Return a copy of this suit (Suits are immutable, so this is the Suit itself)."""
+		return self
+
+	def __setattr__(self, name, value):
+		raise AttributeError('Suit objects are immutable')
+	def __delattr__(self, name):
+		raise AttributeError('Suit objects are immutable')
+	def __reduce__(self):
+		return (Suit, (self.num,))
 
 	def __str__(self):
 		return self.suit
@@ -202,25 +207,80 @@ class Suit():
 			   ', color:' + str(self.get_color()) + '>'
 
 	def __eq__(self, other):
-		return int(self) == int(Suit(other))
+		return self is _as_suit(other)
 	def __ne__(self, other):
-		return int(self) != int(Suit(other))
+		return self is not _as_suit(other)
 	def __add__(self, other):
 		return str(Number(other)) + ' of ' + str(self) + 's'
 	def __hash__(self):
-		return hash(int(self))
+		return hash(self.num)
+
+
+def _as_number(other):
+	"""Return other as a canonical Number, only converting it if it isn't one already."""
+	if type(other) is Number:
+		return other
+	return Number(other)
+
+def _as_suit(other):
+	"""Return other as a canonical Suit, only converting it if it isn't one already."""
+	if type(other) is Suit:
+		return other
+	return Suit(other)
+
+
+_NUMBER_ALIASES = (
+	('Joker', {"JOKER", "FOURTEEN", "ZERO", "14", "0"}),
+	('Ace', {"ACE", "ONE", "1", "A"}),
+	('Two', {"TWO", "2"}),
+	('Three', {"THREE", "3"}),
+	('Four', {"FOUR", "4"}),
+	('Five', {"FIVE", "5"}),
+	('Six', {"SIX", "6"}),
+	('Seven', {"SEVEN", "7"}),
+	('Eight', {"EIGHT", "8"}),
+	('Nine', {"NINE", "9"}),
+	('Ten', {"TEN", "10"}),
+	('Jack', {"JACK", "ELEVEN", "11", "J"}),
+	('Queen', {"QUEEN", "TWELVE", "12", "Q"}),
+	('King', {"KING", "THIRTEEN", "13", "K"}),
+)
+_SUIT_ALIASES = (
+	('Heart', {"HEART", "HEARTS", "0", "ZERO", "H"}),
+	('Club', {"CLUB", "CLUBS", "1", "ONE", "C"}),
+	('Diamond', {"DIAMOND", "DIAMONDS", "2", "TWO", "D"}),
+	('Spade', {"SPADE", "SPADES", "3", "THREE", "S"}),
+)
+
+# Every Number and Suit in existence, indexed by their integer representation
+NUMBERS = tuple(Number._create(name, num) for num, (name, aliases) in enumerate(_NUMBER_ALIASES))
+SUITS = tuple(Suit._create(name, num) for num, (name, aliases) in enumerate(_SUIT_ALIASES))
+
+# Maps every accepted spelling (upper case strs and ints) to its canonical instance
+_NUMBER_LOOKUP = {alias: NUMBERS[num] for num, (name, aliases) in enumerate(_NUMBER_ALIASES) for alias in aliases}
+_NUMBER_LOOKUP.update({num: NUMBERS[num] for num in range(14)})
+_NUMBER_LOOKUP[14] = NUMBERS[0]
+_SUIT_LOOKUP = {alias: SUITS[num] for num, (name, aliases) in enumerate(_SUIT_ALIASES) for alias in aliases}
+_SUIT_LOOKUP.update({num: SUITS[num] for num in range(4)})
 
 
 class PlayingCard(Card):
 	"""
 	Represents a playing card with an associated number and suit.
 
+	Every one of the 54 distinct playing cards has an integer code: suit * 13 + number - 1 for the
+	52 standard cards, then 52 for the red Joker and 53 for the black Joker. A card's byte is its
+	code with FACE_DOWN_BIT set when the card is face down.
+
 	Attributes:
 		number (Number): The number on the playing card.
 		suit (Suit): The suit of the playing card.
 		color (str): The color of the playing card.
+		code (int): The integer code identifying the playing card.
 	"""
 
+	FACE_DOWN_BIT = 0x80
+
 	@classmethod
 	def parse(cls, string):
 		"""
@@ -232,37 +292,69 @@ class PlayingCard(Card):
 			raise ValueError('When using parse to create PlayingCard, string must be in form "number of suit".')
 		return cls(words[0], words[1])
 
+	@classmethod
+	def from_code(cls, code, face_one_up=True):
+		"""Return the PlayingCard identified by code."""
+		card = cls.__new__(cls)
+		card._assign(code, face_one_up)
+		return card
+	@classmethod
+	def from_byte(cls, byte):
+		"""Return the PlayingCard encoded by byte."""
+		card = cls.__new__(cls)
+		card._assign(byte & ~PlayingCard.FACE_DOWN_BIT, not byte & PlayingCard.FACE_DOWN_BIT)
+		return card
+
 	def __init__(self, number='Ace', suit='Spade', face_one_up=True):
-		self.number = Number(number)
-		self.suit = Suit(suit)
-		self.color = self.suit.get_color()
-		
-		if str(self.number) == "Joker":
-			Card.__init__(self, str(self.number), face_one_up=face_one_up)
-		else:
-			Card.__init__(self, self.number + self.suit, face_one_up=face_one_up)
+		number = _as_number(number)
+		suit = _as_suit(suit)
+
+		self._assign(_CARD_CODES[suit.num][number.num], face_one_up)
+		# Jokers are only identified by color, so keep the exact suit they were given
+		self.suit = suit
+
+	def _assign(self, code, face_one_up):
+		self.code = code
+		self.number, self.suit, self.color, self.face_one = _PLAYING_CARDS[code]
+		self.face_two = Card.FACE_DOWN
+		self.face_one_up = face_one_up
 
 	def __int__(self):
 		"""Return int(self)."""
-		return int(self.number)
+		return self.number.num
 	def __repr__(self):
 		return '<PlayingCard number:' + str(self.number) + ', suit:' + str(self.suit) + ', color:' + str(self.color) + '>'
 
 	def eq_number(self, other):
 		"""Return self.number == Number(other)."""
-		return Number(other) == self.number
+		return _as_number(other) is self.number
 	def eq_suit(self, other):
 		"""Return self.suit == Suit(other)."""
-		return self.suit == Suit(other)
+		return self.suit is _as_suit(other)
 	def eq_color(self, other):
 		"""Return self.color == other."""
 		return self.color == other
 	def is_face_card(self):
 		"""Return whether this PlayingCard is a face card."""
-		return self.number.is_face_card()
+		return self.number.num > 10
+	def to_byte(self):
+		"""Return the byte encoding this PlayingCard's code and orientation."""
+		return self.code if self.face_one_up else self.code | PlayingCard.FACE_DOWN_BIT
 	def copy(self):
 		"""Return a copy of this PlayingCard."""
-		return PlayingCard(self.number.copy(), self.suit.copy(), self.face_one_up)
+		card = PlayingCard.__new__(PlayingCard)
+		card.__dict__.update(self.__dict__)
+		return card
+
+	# PlayingCards are equal when they have the same code, whichever way up they are
+	def __eq__(self, other):
+		if isinstance(other, PlayingCard):
+			return self.code == other.code
+		return Card.__eq__(self, other)
+	def __ne__(self, other):
+		return not self == other
+	def __hash__(self):
+		return self.code
 
 	def __le__(self, other):
 		return int(self) <= int(other)
@@ -277,10 +369,224 @@ class PlayingCard(Card):
 		return int(self) + int(other)
 
 
+# The identity of each of the 54 playing cards indexed by code: (number, suit, color, face_one)
+_PLAYING_CARDS = tuple(
+	[(NUMBERS[num], SUITS[suit], SUITS[suit].get_color(), NUMBERS[num] + SUITS[suit])
+		for suit in range(4) for num in range(1, 14)] +
+	[(NUMBERS[0], SUITS[suit], SUITS[suit].get_color(), str(NUMBERS[0])) for suit in range(2)]
+)
+# The code of each playing card indexed by [suit][number]
+_CARD_CODES = tuple(
+	tuple([52 + suit%2] + [suit*13 + num - 1 for num in range(1, 14)]) for suit in range(4)
+)
+
+
+# bytes.translate tables used to flip every card in a CardArray at once
+_FLIP_TABLE = bytes(byte ^ PlayingCard.FACE_DOWN_BIT for byte in range(256))
+_FACE_UP_TABLE = bytes(byte & ~PlayingCard.FACE_DOWN_BIT for byte in range(256))
+_FACE_DOWN_TABLE = bytes(byte | PlayingCard.FACE_DOWN_BIT for byte in range(256))
+
+
+class CardArray():
+	"""
+	A list-like sequence of PlayingCards stored compactly as one byte per card (see PlayingCard.to_byte).
+
+	PlayingCards are only created when they are accessed, and they are detached from the array:
+	flipping a card that was read from a CardArray doesn't change the array. Use flip(), flip_cards()
+	or assignment instead.
+
+	Attributes:
+		codes (array): The bytes of the cards in the sequence.
+	"""
+
+	def __init__(self, cards=()):
+		if isinstance(cards, CardArray):
+			self.codes = array('B', cards.codes)
+		else:
+			self.codes = array('B', [card.to_byte() for card in cards])
+
+	@classmethod
+	def from_codes(cls, codes):
+		"""Return a CardArray which takes ownership of codes, an array('B') of card bytes."""
+		cards = cls.__new__(cls)
+		cards.codes = codes
+		return cards
+
+	def __repr__(self):
+		return repr(list(self))
+
+	def __len__(self):
+		return len(self.codes)
+	def __iter__(self):
+		return map(PlayingCard.from_byte, self.codes)
+	def __reversed__(self):
+		return map(PlayingCard.from_byte, reversed(self.codes))
+	def __contains__(self, card):
+		return card.code in self.codes or card.code | PlayingCard.FACE_DOWN_BIT in self.codes
+
+	def __getitem__(self, item):
+		if isinstance(item, slice):
+			return CardArray.from_codes(self.codes[item])
+		return PlayingCard.from_byte(self.codes[item])
+	def __setitem__(self, item, value):
+		if isinstance(item, slice):
+			self.codes[item] = CardArray(value).codes
+		else:
+			self.codes[item] = value.to_byte()
+	def __delitem__(self, item):
+		del self.codes[item]
+	def __add__(self, other):
+		return CardArray.from_codes(self.codes + CardArray(other).codes)
+	def __iadd__(self, other):
+		self.extend(other)
+		return self
+
+	def index(self, card):
+		"""Return the index of the first occurrence of card in either orientation."""
+		for i, byte in enumerate(self.codes):
+			if byte & ~PlayingCard.FACE_DOWN_BIT == card.code:
+				return i
+		raise ValueError(str(card) + ' is not in CardArray')
+	def add(self, card):
+		"""Append card unless it is already in the array, like set.add."""
+		if card not in self:
+			self.codes.append(card.to_byte())
+	def append(self, card):
+		self.codes.append(card.to_byte())
+	def insert(self, index, card):
+		self.codes.insert(index, card.to_byte())
+	def extend(self, cards):
+		if isinstance(cards, CardArray):
+			self.codes.extend(cards.codes)
+		else:
+			self.codes.extend([card.to_byte() for card in cards])
+	def pop(self, index=-1):
+		return PlayingCard.from_byte(self.codes.pop(index))
+	def remove(self, card):
+		del self.codes[self.index(card)]
+	def clear(self):
+		del self.codes[:]
+	def copy(self):
+		return CardArray.from_codes(array('B', self.codes))
+	def reverse(self):
+		self.codes.reverse()
+	def sort(self, key=None, reverse=False):
+		"""Stable sort of the cards in place, only creating one PlayingCard per distinct byte."""
+		if key is None:
+			key = int
+		keys = {byte: key(PlayingCard.from_byte(byte)) for byte in set(self.codes)}
+		self.codes = array('B', sorted(self.codes, key=keys.__getitem__, reverse=reverse))
+	def flip(self):
+		"""Reverse which face is flipped up on every card."""
+		self.codes = array('B', self.codes.tobytes().translate(_FLIP_TABLE))
+	def flip_cards(self, turned_up):
+		"""Turn every card face up if turned_up, else face down."""
+		table = _FACE_UP_TABLE if turned_up else _FACE_DOWN_TABLE
+		self.codes = array('B', self.codes.tobytes().translate(table))
+
+
+def make_rng(rng=None):
+	"""
+	Return a random number generator from rng.
+	rng can be a random.Random, the random module or anything else with shuffle and randbytes (returned as is),
+	a seed for a new random.Random, or None for the random module.
+	"""
+	if rng is None:
+		return random
+	if isinstance(rng, random.Random) or (hasattr(rng, 'shuffle') and hasattr(rng, 'randbytes')):
+		return rng
+	return random.Random(rng)
+
+def spawn_seeds(seed, count):
+	"""
+	Return count seeds derived from seed which produce statistically independent random streams.
+	Each child seed is a hash of the parent seed and the child's index, so the same seed always spawns the
+	same children, and children can spawn their own children. A seed of None draws fresh entropy from the OS.
+	"""
+	if seed is None:
+		seed = random.SystemRandom().getrandbits(128)
+
+	parent = repr(seed).encode()
+	return [int.from_bytes(sha256(parent + b'/' + str(i).encode()).digest()[:16], 'big') for i in range(count)]
+
+def spawn_rngs(seed, count):
+	"""Return count independent random.Randoms seeded from spawn_seeds(seed, count)."""
+	return [random.Random(child) for child in spawn_seeds(seed, count)]
+
+
+# Keys for sorting cards
+RANK = 'rank'
+SUIT = 'suit'
+COLOR = 'color'
+
+# Lookups of the sort key of every card byte, by the keys and whether aces are high
+_SORT_TABLES = {}
+
+def _sort_table(by, aces_high):
+	"""Return a list of the combined sort key of each card byte, and how many different keys there could be."""
+	if (by, aces_high) in _SORT_TABLES:
+		return _SORT_TABLES[(by, aces_high)]
+
+	table = []
+	for byte in range(256):
+		code = byte & ~PlayingCard.FACE_DOWN_BIT
+		if code >= len(_PLAYING_CARDS):
+			table.append(0)
+			continue
+
+		number, suit, color, face = _PLAYING_CARDS[code]
+		key = 0
+		for name in by:
+			if name == RANK:
+				key = key * 15 + (14 if aces_high and number.num == 1 else number.num)
+			elif name == SUIT:
+				key = key * 4 + suit.num
+			elif name == COLOR:
+				key = key * 2 + (color == 'Black')
+			else:
+				raise ValueError('Unknown sort key: ' + repr(name))
+		table.append(key)
+
+	size = 1
+	for name in by:
+		size *= {RANK: 15, SUIT: 4, COLOR: 2}[name]
+
+	_SORT_TABLES[(by, aces_high)] = (table, size)
+	return table, size
+
+def _bucket_sort(items, keys, size, high_first):
+	"""Stable counting sort of items by their keys, each less than size."""
+	buckets = [[] for i in range(size)]
+	for item, key in zip(items, keys):
+		buckets[key].append(item)
+	if high_first:
+		buckets.reverse()
+	return [item for bucket in buckets for item in bucket]
+
+def sort_codes(codes, by=(RANK,), high_first=False, aces_high=False):
+	"""
+	Return a list of card codes or bytes sorted from lowest to highest, or highest to lowest if high_first.
+
+	by is the keys to sort by, most important first: RANK (Jokers, then Ace to King, or Two to Ace if aces_high),
+	SUIT (Hearts, Clubs, Diamonds, Spades, with the red Joker as a Heart and the black one as a Club) and
+	COLOR (Red, then Black). For example (SUIT, RANK) sorts by suit then rank, and (RANK, SUIT) by rank then suit.
+	Orientation is ignored. The sort is a stable counting sort over the codes, so it takes O(n) time and
+	codes which tie keep their order.
+	"""
+	table, size = _sort_table(tuple(by), aces_high)
+	codes = list(codes)
+	return _bucket_sort(codes, [table[code] for code in codes], size, high_first)
+
+
 class Pile:
 
-	def __init__(self, cards=set()):
-		self.cards = set(cards)
+	# Used by shuffling and random_card unless an instance is given its own through the rng argument
+	rng = random
+
+	def __init__(self, cards=set(), compact=False, rng=None):
+		self.cards = CardArray(set(cards)) if compact else set(cards)
+		if rng is not None:
+			self.rng = make_rng(rng)
 
 	def __str__(self):
 		return str({str(card) for card in self})
@@ -289,6 +595,12 @@ class Pile:
 	
 	def add(self, card):
 		self.cards.add(card)
+	def add_many(self, cards):
+		"""Add every card in cards at once."""
+		if isinstance(self.cards, set):
+			self.cards.update(cards)
+		else:
+			self.cards.extend(cards)
 	def remove(self, card):
 		self.cards.remove(card)
 		return card
@@ -297,22 +609,61 @@ class Pile:
 		self.cards.clear()
 		return temp
 	def flip(self):
+		if isinstance(self.cards, CardArray):
+			self.cards.flip()
+			return
 		for card in self:
 			card.flip()
 	def flip_face_up(self):
-		for card in self:
-			card.flip_face_up()
+		self.flip_cards(True)
 	def flip_face_down(self):
-		for card in self:
-			card.flip_face_down()
+		self.flip_cards(False)
 	def flip_cards(self, up_or_down):
+		if isinstance(self.cards, CardArray):
+			self.cards.flip_cards(up_or_down)
+			return
 		for card in self:
 			card.flip_card(up_or_down)
 	def random_card(self):
-		return choice(list(self.cards))
+		return self.rng.choice(list(self.cards))
 	def copy(self):
 		cls = type(self)
-		return cls([card.copy() for card in self])
+
+		if isinstance(self.cards, CardArray):
+			copied = cls([])
+			copied.cards = self.cards.copy()
+		else:
+			copied = cls([card.copy() for card in self])
+
+		if 'rng' in vars(self):
+			copied.rng = self.rng
+		return copied
+
+	def to_bytes(self):
+		"""
+		Return the pile in the compact binary format read by load_pile(). See the Serialization section.
+		Raises a ValueError if the pile has over 65535 cards or 65535 bytes of properties.
+		"""
+		return _pack(self)
+	def transfer_to(self, other):
+		"""Move all of the cards into the pile other in place, leaving this pile empty. Returns other."""
+		other.extend_from(self)
+		return other
+	def extend_from(self, other):
+		"""
+		Move all of the cards from the pile other into this pile in place, leaving other empty.
+		other's container of cards is handed over rather than copied, and merged in with a single update or extend.
+		"""
+		cards = other._take_cards()
+		if isinstance(self.cards, set):
+			self.cards.update(cards)
+		else:
+			self.cards.extend(cards)
+	def _take_cards(self):
+		"""Return the pile's container of cards, giving the pile a new empty one."""
+		cards = self.cards
+		self.cards = type(cards)()
+		return cards
 
 	def __len__(self):
 		return len(self.cards)
@@ -355,9 +706,18 @@ class Pile:
 
 
 class Deck(Pile):
+	"""
+	An ordered pile of cards. deck[0] and iteration start from the top card.
+
+	The cards are stored bottom first, so that the top of the deck is the end of self.cards and
+	adding or drawing cards at the top is O(1).
+	"""
 	
-	def __init__(self, cards=[], fill=False, **kwargs):
-		self.cards = list(cards)
+	def __init__(self, cards=[], fill=False, compact=False, rng=None, **kwargs):
+		self.cards = CardArray(cards) if compact else list(cards)
+		self.cards.reverse()
+		if rng is not None:
+			self.rng = make_rng(rng)
 
 		if fill:
 			self._fill_deck(**kwargs)
@@ -365,34 +725,87 @@ class Deck(Pile):
 	def __str__(self):
 		return str([str(card) for card in self])
 	def __repr__(self):
-		return '<Deck cards:' + str(self.cards) + '>'
+		return '<Deck cards:' + str(list(self)) + '>'
 
 	def add(self, card):
-		self.cards.insert(0, card)
+		self.cards.append(card)
+	def add_many(self, cards):
+		"""Add each card in cards to the top of the deck in turn, so the last one ends up on top."""
+		self.cards.extend(cards)
 	def draw(self):
-		return self.cards.pop(0)
+		return self.cards.pop()
+	def draw_many(self, count):
+		"""Draw count cards from the top of the deck, returning them in the order they were drawn."""
+		if count > len(self.cards) or count < 0:
+			raise IndexError('Can\'t draw ' + str(count) + ' cards from a deck of ' + str(len(self.cards)))
+
+		start = len(self.cards) - count
+		drawn = self.cards[start:]
+		del self.cards[start:]
+		drawn.reverse()
+		return drawn
 	def add_to_bottom(self, card):
-		self.cards.append(card)
+		self.cards.insert(0, card)
 	def draw_from_bottom(self, card):
-		return self.cards.pop(-1)
+		return self.cards.pop(0)
+	def empty(self):
+		temp = self.cards[::-1]
+		self.cards.clear()
+		return temp
 	def shuffle(self):
-		shuffle(self.cards)
-	def sort(self, high_first=False, aces_high=False, suits=False):
-		if suits:
-			card_sort = lambda card: int(card.suit)
-		elif high_first and aces_high:
-			card_sort = lambda card: -((int(card) - 2) % 14)
-		elif high_first:
-			card_sort = lambda card: -int(card)
-		elif aces_high:
-			card_sort = lambda card: (int(card) - 2) % 14
-		else:
-			basic_sort = lambda card: int(card)
+		self.rng.shuffle(self.cards.codes if isinstance(self.cards, CardArray) else self.cards)
+	def shuffle_many(self, n_decks):
+		"""Return a DeckBatch of n_decks independent shuffles of this deck, leaving the deck untouched."""
+		return DeckBatch(n_decks, deck=self, rng=self.rng)
+	def sort(self, high_first=False, aces_high=False, suits=False, by=None):
+		"""
+		Sort the deck in place so that reading from the top, the cards go from lowest to highest, or highest to lowest
+		if high_first. See sort_codes() for the keys which can be given in by, which defaults to (SUIT,) if suits,
+		else (RANK,). The sort is stable, so cards which tie keep the order they were in from the top.
+		"""
+		if by is None:
+			by = (SUIT,) if suits else (RANK,)
 
-		self.cards = sorted(self.cards, key=card_sort)
+		if isinstance(self.cards, CardArray):
+			ordered = sort_codes(reversed(self.cards.codes), by, high_first, aces_high)
+			ordered.reverse()
+			self.cards.codes = array('B', ordered)
+		else:
+			table, size = _sort_table(tuple(by), aces_high)
+			ordered = _bucket_sort(reversed(self.cards), [table[card.code] for card in reversed(self.cards)], size,
+				high_first)
+			ordered.reverse()
+			self.cards[:] = ordered
 
+	def __iter__(self):
+		return reversed(self.cards)
 	def __getitem__(self, item):
-		return self.cards[item]
+		if isinstance(item, slice):
+			return self.cards[::-1][item]
+		return self.cards[-1 - item]
+
+	def __iadd__(self, other):
+		if isinstance(other, Pile):
+			added = list(other.empty())
+		else:
+			added = list(other)
+			other.clear()
+
+		# The added cards go underneath, in order from the top
+		added.reverse()
+		self.cards[:0] = added
+
+		return self
+	def extend_from(self, other):
+		"""
+		Move all of the cards from the pile other underneath this deck in place, leaving other empty.
+		They keep the order they were in, so other's top card ends up just under this deck's old bottom card.
+		"""
+		cards = other._take_cards()
+		if isinstance(self.cards, CardArray):
+			self.cards.codes[:0] = cards.codes if isinstance(cards, CardArray) else CardArray(cards).codes
+		else:
+			self.cards[:0] = cards
 
 	def deal(self, piles=None, deck_count=None, card_count=None, even=False):
 		cls = type(self)
@@ -401,7 +814,10 @@ class Deck(Pile):
 			if not deck_count:
 				raise ValueError('deal() requires either piles or deck_count as a parameter')
 
-			piles = [cls([]) for i in range(deck_count)]
+			if isinstance(self.cards, CardArray):
+				piles = [cls([], compact=True) for i in range(deck_count)]
+			else:
+				piles = [cls([]) for i in range(deck_count)]
 
 		if card_count and len(piles) * card_count <= len(self):
 			total = len(piles) * card_count
@@ -410,30 +826,311 @@ class Deck(Pile):
 		else:
 			total = len(self)
 
-		for i in range(total):
-			piles[i % len(piles)].add(self.draw())
+		# Dealing round robin gives each pile every len(piles)th card from the top, which is a strided slice
+		dealt = self.draw_many(total)
+		for i, pile in enumerate(piles):
+			pile.add_many(dealt[i::len(piles)])
 
 		return piles
 
 	def _fill_deck(self, jokers=False):
 		assert len(self) == 0, 'Can\'t fill a non-empty deck: len=' + str(len(self))
 
-		for suit in range(4):
-			for num in range(1, 14):
-				self.add_to_bottom(PlayingCard(num, suit))
+		# Codes count up from the Ace of Hearts on top to the Jokers on the bottom
+		codes = range((54 if jokers else 52) - 1, -1, -1)
+
+		if isinstance(self.cards, CardArray):
+			self.cards.codes.extend(codes)
+		else:
+			self.cards.extend([PlayingCard.from_code(code) for code in codes])
+
+
+class Shoe(Deck):
+	"""
+	A Deck made from several full decks, with a cut card and a running count of the cards left of each Number.
+
+	Played cards go into the discard tray with discard() rather than back into the shoe. Once enough cards have been
+	drawn to reach the cut card, cut_card_out() is True and shuffle_if_needed() gathers the discards back in and
+	reshuffles. Until then nothing is reshuffled.
+
+	Attributes:
+		discards (Deck): The discard tray.
+		penetration (float): The fraction of the shoe which is dealt before the cut card comes out.
+		size (int): The number of cards in the shoe and the discard tray together.
+		counts (list): The number of cards left in the shoe of each Number, indexed by int(Number).
+	"""
+
+	def __init__(self, decks=6, penetration=0.75, jokers=False, compact=False, rng=None):
+		# decks can also be a list of cards, top first, like Deck takes, so Pile's operators can build Shoes
+		if isinstance(decks, int):
+			Deck.__init__(self, compact=compact, rng=rng)
+			for i in range(decks):
+				self.cards.extend(Deck(fill=True, compact=compact, jokers=jokers).cards)
+		else:
+			Deck.__init__(self, decks, compact=compact, rng=rng)
+
+		self.discards = Deck(compact=compact)
+		self.penetration = penetration
+		self.size = len(self.cards)
+		self._recount()
+
+	def __repr__(self):
+		return '<Shoe size:' + str(self.size) + ', penetration:' + str(self.penetration) + \
+			', remaining:' + str(len(self)) + ', discards:' + str(len(self.discards)) + '>'
+
+	def _recount(self):
+		self.counts = [0] * 14
+		for card in self.cards:
+			self.counts[int(card)] += 1
+
+	def remaining(self, number):
+		"""Return how many cards of number are left in the shoe."""
+		return self.counts[_as_number(number).num]
+	def composition(self):
+		"""Return the number of cards left of each Number as a tuple indexed by int(Number)."""
+		return tuple(self.counts)
+	def cut_card_out(self):
+		"""Return whether the cut card has been reached."""
+		return len(self.cards) <= self.size - int(self.size * self.penetration)
+
+	def discard(self, cards):
+		"""Move cards (a Pile or a list, which is emptied) into the discard tray."""
+		if isinstance(cards, Pile):
+			self.discards.extend_from(cards)
+		else:
+			self.discards += cards
+	def shuffle(self):
+		"""Gather the discards back into the shoe and shuffle it."""
+		self.cards.extend(self.discards.cards)
+		self.discards.cards.clear()
+		Deck.shuffle(self)
+		self._recount()
+	def shuffle_if_needed(self):
+		"""Shuffle the shoe if the cut card is out, returning whether it was shuffled."""
+		if self.cut_card_out():
+			self.shuffle()
+			return True
+		return False
+
+	def hands(self, hand_size, count=None, evaluate=None):
+		"""
+		Lazily yield new OrderedHands of hand_size cards dealt from the top of the shoe, forever or until count have
+		been dealt. OrderedHands are used so that the same card dealt twice from a multi-deck shoe is kept twice.
+
+		The shoe is reshuffled whenever the cut card comes out, and a copy of each hand goes into the discard tray
+		so the shoe never runs dry, whatever the caller does with the hands. Hands value their cards with evaluate,
+		or Hand.hand_sum, and are compact if the shoe is.
+		"""
+		dealt = 0
+		while count is None or dealt < count:
+			drawn = self._draw_streamed(hand_size, True)
+			hand = OrderedHand(drawn, evaluate=evaluate or Hand.hand_sum, compact=isinstance(drawn, CardArray))
+			dealt += 1
+			yield hand
+	def batches(self, hand_size, batch_size=1024, count=None):
+		"""
+		Lazily yield array('B')s holding the card bytes of batch_size hands of hand_size cards each, one hand after
+		another, forever or until count hands have been dealt, with the last batch cut short if needed.
+
+		Hands are dealt as in hands(), but no PlayingCards are made for a compact shoe. Only one batch is built at
+		a time, so memory stays bounded by batch_size however long the stream runs, and batches can be handed
+		straight to batch evaluators like poker.rank_many(batch, hand_size), which takes the same card dealt twice
+		but raises a ValueError for more than 4 cards of a rank.
+		"""
+		dealt = 0
+		while count is None or dealt < count:
+			size = batch_size if count is None else min(batch_size, count - dealt)
+			batch = array('B')
+			for i in range(size):
+				drawn = self._draw_streamed(hand_size, False)
+				if isinstance(drawn, CardArray):
+					batch.extend(drawn.codes)
+				else:
+					batch.extend([card.to_byte() for card in drawn])
+			dealt += size
+			yield batch
+	def _draw_streamed(self, hand_size, copy):
+		"""
+		Draw hand_size cards for hands() or batches(), shuffling first if the cut card is out or the shoe is too short,
+		and put them, or copies of them if copy, into the discard tray.
+		"""
+		if self.cut_card_out() or len(self.cards) < hand_size:
+			self.shuffle()
+			if len(self.cards) < hand_size:
+				raise ValueError('Can\'t deal hands of ' + str(hand_size) + ' cards from a shoe of ' + str(len(self.cards)))
+
+		drawn = self.draw_many(hand_size)
+		if copy and not isinstance(drawn, CardArray):
+			self.discards.add_many([card.copy() for card in drawn])
+		else:
+			self.discards.add_many(drawn)
+		return drawn
+
+	def add(self, card):
+		Deck.add(self, card)
+		self.counts[int(card)] += 1
+	def add_many(self, cards):
+		cards = list(cards)
+		Deck.add_many(self, cards)
+		for card in cards:
+			self.counts[int(card)] += 1
+	def remove(self, card):
+		card = Deck.remove(self, card)
+		self.counts[int(card)] -= 1
+		return card
+	def draw(self):
+		card = Deck.draw(self)
+		self.counts[int(card)] -= 1
+		return card
+	def draw_many(self, count):
+		drawn = Deck.draw_many(self, count)
+		for card in drawn:
+			self.counts[int(card)] -= 1
+		return drawn
+	def add_to_bottom(self, card):
+		Deck.add_to_bottom(self, card)
+		self.counts[int(card)] += 1
+	def draw_from_bottom(self, card):
+		card = Deck.draw_from_bottom(self, card)
+		self.counts[int(card)] -= 1
+		return card
+	def empty(self):
+		self.counts = [0] * 14
+		return Deck.empty(self)
+	def copy(self):
+		copied = Shoe(0, self.penetration, compact=isinstance(self.cards, CardArray))
+		copied.cards = self.cards.copy() if isinstance(self.cards, CardArray) else [card.copy() for card in self.cards]
+		copied.discards = self.discards.copy()
+		copied.size = self.size
+		copied.counts = list(self.counts)
+		if 'rng' in vars(self):
+			copied.rng = self.rng
+		return copied
+	def deal(self, piles=None, deck_count=None, card_count=None, even=False):
+		if not piles and deck_count:
+			piles = [Deck(compact=isinstance(self.cards, CardArray)) for i in range(deck_count)]
+		return Deck.deal(self, piles, deck_count, card_count, even)
+
+	def __iadd__(self, other):
+		Deck.__iadd__(self, other)
+		self._recount()
+		return self
+	def extend_from(self, other):
+		Deck.extend_from(self, other)
+		self._recount()
+	def _take_cards(self):
+		self.counts = [0] * 14
+		return Deck._take_cards(self)
+
+
+class DeckBatch():
+	"""
+	Many independently shuffled copies of a deck, stored as rows of one contiguous array('B') of card bytes.
+
+	All of the permutations are generated in one pass: every card gets a random 64 bit key whose lowest
+	byte is the card's byte, each row of keys is sorted, and the cards are read back out of the low bytes.
+	No PlayingCards are created until a deck is taken out of the batch.
+
+	Attributes:
+		codes (array): The card bytes of every deck, one row after another, each row top first.
+		deck_size (int): The number of cards in each deck.
+	"""
+
+	def __init__(self, n_decks, deck=None, jokers=False, rng=None):
+		if deck is None:
+			source = bytes(range(54 if jokers else 52))
+		else:
+			source = CardArray(deck).codes.tobytes()
+
+		self.deck_size = len(source)
+		self.codes = _shuffled_rows(source, n_decks, make_rng(rng))
+
+	def __repr__(self):
+		return '<DeckBatch decks:' + str(len(self)) + ', deck_size:' + str(self.deck_size) + '>'
 
-		if jokers:
-			self.add_to_bottom(PlayingCard(0, 0))
-			self.add_to_bottom(PlayingCard(0, 1))
+	def row(self, index):
+		"""Return a read-only memoryview of the card bytes of deck index, top first, without copying."""
+		start = range(len(self))[index] * self.deck_size
+		return memoryview(self.codes)[start:start + self.deck_size].toreadonly()
+
+	def __len__(self):
+		return len(self.codes) // self.deck_size if self.deck_size else 0
+	def __iter__(self):
+		for index in range(len(self)):
+			yield self[index]
+	def __getitem__(self, index):
+		"""Return deck index as a new compact Deck."""
+		start = range(len(self))[index] * self.deck_size
+
+		deck = Deck(compact=True)
+		deck.cards = CardArray.from_codes(self.codes[start:start + self.deck_size])
+		deck.cards.reverse()
+		return deck
+
+
+def _shuffled_rows(source, n_rows, rng):
+	"""Return n_rows independent shuffles of the bytes in source, concatenated into one array('B')."""
+	size = len(source)
+	if size == 0 or n_rows == 0:
+		return array('B')
+
+	# The lowest byte of each key is overwritten with the card it sorts
+	low_byte = 0 if sys.byteorder == 'little' else 7
+	keys = bytearray(rng.randbytes(8 * size * n_rows))
+	keys[low_byte::8] = source * n_rows
+	keys = memoryview(keys).cast('Q')
+
+	shuffled = array('Q')
+	for start in range(0, len(keys), size):
+		shuffled.extend(sorted(keys[start:start + size]))
+
+	return array('B', shuffled.tobytes()[low_byte::8])
+
+
+class IncrementalEvaluator():
+	"""
+	An evaluate function for Hands which can be updated one card at a time instead of rescanning the hand.
+
+	It can still be called on any iterable of cards like a plain evaluate function. A Hand using one keeps
+	a running state: start() creates it, add() and remove() return it updated for one card coming or going,
+	and value() turns it into the hand's value. The state is rebuilt from scratch the next time the Hand
+	is valued after any bulk change to its cards.
+	"""
+
+	def __call__(self, cards):
+		state = self.start()
+		for card in cards:
+			state = self.add(state, card)
+		return self.value(state)
+	def __repr__(self):
+		return '<' + type(self).__name__ + '>'
+
+	def start(self):
+		"""Return the state of an empty hand."""
+		raise NotImplementedError
+	def add(self, state, card):
+		"""Return state updated for card being added to the hand."""
+		raise NotImplementedError
+	def remove(self, state, card):
+		"""Return state updated for card being removed from the hand."""
+		raise NotImplementedError
+	def value(self, state):
+		"""Return the value of a hand with state."""
+		return state
 
 
 class Hand(Pile):
 
+	# The running state of an IncrementalEvaluator, or None when it needs to be rebuilt
+	_state = None
+
 	def hand_sum(cards):
 		return sum([int(card) for card in cards])
 
-	def __init__(self, cards=set(), evaluate=hand_sum, name=None, **kwargs):
-		self.cards = set(cards)
+	def __init__(self, cards=set(), evaluate=hand_sum, name=None, compact=False, rng=None, **kwargs):
+		self.cards = CardArray(set(cards)) if compact else set(cards)
+		if rng is not None:
+			self.rng = make_rng(rng)
 
 		self._evaluate = evaluate
 		self.properties = kwargs
@@ -458,15 +1155,60 @@ class Hand(Pile):
 		return '<Hand name:' + str(self.properties.get('name')) + ', evaluate:' + str(self._evaluate) + \
 			', properties:' + str(self.properties) + ', cards:' + str(self.cards) + '>'
 
+	def add(self, card):
+		# Adding a card already in a set backed or compact hand leaves it unchanged
+		size = len(self.cards)
+		super().add(card)
+		if self._state is not None and len(self.cards) > size:
+			self._state = self._evaluate.add(self._state, card)
+	def remove(self, card):
+		super().remove(card)
+		if self._state is not None:
+			self._state = self._evaluate.remove(self._state, card)
+		return card
+	def add_many(self, cards):
+		self._state = None
+		super().add_many(cards)
+	def empty(self):
+		self._state = None
+		return super().empty()
+	def __iadd__(self, other):
+		self._state = None
+		return super().__iadd__(other)
+	def extend_from(self, other):
+		self._state = None
+		super().extend_from(other)
+	def _take_cards(self):
+		self._state = None
+		return super()._take_cards()
+
 	def value(self):
-		return self._evaluate(self)
-	def view(self):
-		visible = self.copy()
-		visible.flip_face_up()
-		return visible
+		evaluate = self._evaluate
+		if not isinstance(evaluate, IncrementalEvaluator):
+			return evaluate(self)
+
+		if self._state is None:
+			state = evaluate.start()
+			for card in self:
+				state = evaluate.add(state, card)
+			self._state = state
+
+		return evaluate.value(self._state)
+	def view(self, face_one_up=True, visible_only=False, select=None):
+		"""Return a read-only HandView of this hand, which shows its cards face up by default without copying them."""
+		return HandView(self, face_one_up, visible_only, select)
 	def copy(self):
 		cls = type(self)
-		return cls([card.copy() for card in self], self._evaluate, **self.properties)
+
+		if isinstance(self.cards, CardArray):
+			copied = cls([], self._evaluate, **self.properties)
+			copied.cards = self.cards.copy()
+		else:
+			copied = cls([card.copy() for card in self], self._evaluate, **self.properties)
+
+		if 'rng' in vars(self):
+			copied.rng = self.rng
+		return copied
 
 	def __getitem__(self, key):
 		return self.properties[key]
@@ -478,8 +1220,11 @@ class Hand(Pile):
 
 class OrderedHand(Hand, Deck):
 
-	def __init__(self, cards=[], evaluate=Hand.hand_sum, name=None, **kwargs):
-		self.cards = list(cards)
+	def __init__(self, cards=[], evaluate=Hand.hand_sum, name=None, compact=False, rng=None, **kwargs):
+		self.cards = CardArray(cards) if compact else list(cards)
+		self.cards.reverse()
+		if rng is not None:
+			self.rng = make_rng(rng)
 
 		self._evaluate = evaluate
 		self.properties = kwargs
@@ -487,14 +1232,318 @@ class OrderedHand(Hand, Deck):
 			self['name'] = name
 
 	def __repr__(self):
-		return '<Ordered' + Hand.__repr__(self)[1:]
+		return '<OrderedHand name:' + str(self.properties.get('name')) + ', evaluate:' + str(self._evaluate) + \
+			', properties:' + str(self.properties) + ', cards:' + str(list(self)) + '>'
 
 
+	def add_many(self, cards):
+		self._state = None
+		Deck.add_many(self, cards)
+	def draw(self):
+		card = Deck.draw(self)
+		if self._state is not None:
+			self._state = self._evaluate.remove(self._state, card)
+		return card
+	def draw_many(self, count):
+		self._state = None
+		return Deck.draw_many(self, count)
+	def add_to_bottom(self, card):
+		Deck.add_to_bottom(self, card)
+		if self._state is not None:
+			self._state = self._evaluate.add(self._state, card)
+	def draw_from_bottom(self, card):
+		card = Deck.draw_from_bottom(self, card)
+		if self._state is not None:
+			self._state = self._evaluate.remove(self._state, card)
+		return card
+
 	def __getitem__(self, item):
 		if isinstance(item, str):
 			return self.properties[item]
-		return self.cards[item]
+		return Deck.__getitem__(self, item)
 	def __setitem__(self, key, value):
 		if not isinstance(key, str):
 			raise ValueError('OrderedHand keys can only be strings.')
 		self.properties[key] = value
+
+
+
+class HandView():
+	"""
+	A read-only view of a Hand or OrderedHand which shows its cards turned a given way up, without copying or
+	flipping them. Iterating gives the hand's own cards, which shouldn't be changed through the view.
+
+	A view can also show only part of a hand: with visible_only it only has the cards which are face up in the hand,
+	like the dealer's cards the players can see, and select is a slice of the hand's cards in iteration order.
+	The view always reflects the hand as it is now.
+
+	Attributes:
+		hand (Hand): The hand being viewed.
+		face_one_up (bool): Which way up the cards are shown, or None to show them as they lie.
+		visible_only (bool): Whether the view only has the cards which are face up in the hand.
+		select (slice): Which of the hand's cards the view has, or None for all of them.
+	"""
+
+	def __init__(self, hand, face_one_up=True, visible_only=False, select=None):
+		self.hand = hand
+		self.face_one_up = face_one_up
+		self.visible_only = visible_only
+		self.select = select
+
+	def __iter__(self):
+		cards = iter(self.hand)
+		if self.select is not None:
+			start, stop, step = self.select.start, self.select.stop, self.select.step
+			if all([index is None or index >= 0 for index in (start, stop, step)]):
+				cards = islice(cards, start, stop, step)
+			else:
+				cards = iter(list(cards)[self.select])
+		if self.visible_only:
+			cards = (card for card in cards if card.face_one_up)
+		return cards
+	def __len__(self):
+		if self.select is None and not self.visible_only:
+			return len(self.hand)
+		return sum([1 for card in self])
+	def __contains__(self, card):
+		return any([card == viewed for viewed in self])
+	def __getitem__(self, item):
+		"""Return a property of the hand for a str, else the cards at an index or slice of the view."""
+		if isinstance(item, str):
+			return self.hand.properties[item]
+		return list(self)[item]
+
+	def faces(self):
+		"""Yield the face of each card the way it's shown."""
+		for card in self:
+			up = card.face_one_up if self.face_one_up is None else self.face_one_up
+			yield str(card.face_one) if up else str(card.face_two)
+	def value(self):
+		"""Return the value of the cards in the view with the hand's evaluate function, whichever way up they lie."""
+		if self.select is None and not self.visible_only:
+			return self.hand.value()
+		return self.hand._evaluate(list(self))
+
+	def __str__(self):
+		cards_str = self.hand['name'] + ': ' if 'name' in self.hand.properties else ''
+		faces = list(self.faces())
+		if not faces:
+			return cards_str + 'Empty'
+		return cards_str + ', '.join(faces)
+	def __repr__(self):
+		return '<HandView hand:' + str(self.hand.properties.get('name')) + ', face_one_up:' + str(self.face_one_up) + \
+			', visible_only:' + str(self.visible_only) + ', select:' + str(self.select) + '>'
+
+
+
+# Serialization
+
+# A pile is stored as a 5 byte header followed by the byte of each of its cards (see PlayingCard.to_byte()) in the
+# order they're stored, which for Decks is from the bottom up, and then its properties as JSON if it's a Hand.
+# The header is the index of the pile's type in _KINDS, then the number of cards and the length of the properties
+# as 2 byte little endian ints. Piles can be stored one after another, such as in a file of archived deals.
+# A Shoe is stored as a Deck of the cards left in it.
+
+_KINDS = (Pile, Deck, Hand, OrderedHand)
+_HEADER_SIZE = 5
+
+Record = namedtuple('Record', ['kind', 'cards', 'properties'])
+Record.__doc__ = """
+A stored pile as read by iter_records(): its type, a memoryview of its card bytes and a memoryview of its JSON properties.
+"""
+
+def _pack(pile):
+	kind = max([i for i, cls in enumerate(_KINDS) if isinstance(pile, cls)])
+	if isinstance(pile.cards, CardArray):
+		codes = pile.cards.codes.tobytes()
+	else:
+		codes = bytes([card.to_byte() for card in pile.cards])
+	properties = json.dumps(pile.properties).encode() if isinstance(pile, Hand) and pile.properties else b''
+	if len(codes) > 0xFFFF or len(properties) > 0xFFFF:
+		raise ValueError('Can\'t store a pile with over 65535 cards or 65535 bytes of properties', pile)
+
+	return bytes([kind]) + len(codes).to_bytes(2, 'little') + len(properties).to_bytes(2, 'little') + codes + properties
+
+def iter_records(buffer):
+	"""
+	Yield a Record for each pile stored one after another in buffer, without copying or decoding any cards.
+	buffer can be anything supporting the buffer protocol, like bytes or an mmap of an archive file.
+	"""
+	view = memoryview(buffer)
+	offset = 0
+	while offset < len(view):
+		if offset + _HEADER_SIZE > len(view):
+			raise ValueError('Truncated pile header at offset ' + str(offset))
+
+		if view[offset] >= len(_KINDS):
+			raise ValueError('Unknown pile kind ' + str(view[offset]) + ' at offset ' + str(offset))
+		kind = _KINDS[view[offset]]
+		count = int.from_bytes(view[offset + 1:offset + 3], 'little')
+		size = int.from_bytes(view[offset + 3:offset + 5], 'little')
+		start = offset + _HEADER_SIZE
+		offset = start + count + size
+		if offset > len(view):
+			raise ValueError('Truncated pile at offset ' + str(start - _HEADER_SIZE))
+
+		yield Record(kind, view[start:start + count], view[start + count:offset])
+
+def load_piles(buffer, compact=False, evaluate=None):
+	"""
+	Yield each pile stored one after another in buffer. Piles are compact if compact, and Hands value their cards
+	with evaluate, which defaults to Hand.hand_sum, as functions aren't stored.
+	"""
+	for kind, codes, properties in iter_records(buffer):
+		if issubclass(kind, Hand):
+			pile = kind([], evaluate=evaluate or Hand.hand_sum, compact=compact)
+			if properties:
+				pile.properties = json.loads(bytes(properties))
+		else:
+			pile = kind([], compact=compact)
+
+		if compact:
+			pile.cards = CardArray.from_codes(array('B', codes))
+		else:
+			pile.cards = type(pile.cards)([PlayingCard.from_byte(byte) for byte in codes])
+
+		yield pile
+
+def load_pile(buffer, compact=False, evaluate=None):
+	"""Return the first pile stored in buffer. See load_piles()."""
+	return next(load_piles(buffer, compact, evaluate))
+
+
+
+# Instrumentation
+
+# Counters are kept by name as [calls, seconds, bytes copied]. Instrumentation works by swapping counting wrappers
+# in for the functions below while it's enabled, and the originals back in when it's disabled, so it costs nothing
+# at all while disabled. Times include any instrumented functions called inside.
+_counters = {}
+_originals = []
+
+# The size of an object reference, which is what a list of cards copies per card
+_REFERENCE_SIZE = (sys.maxsize.bit_length() + 1) // 8
+
+def _counter(name):
+	counter = _counters.get(name)
+	if counter is None:
+		counter = _counters[name] = [0, 0.0, 0]
+	return counter
+
+def _counted(name, function):
+	def counted(*args, **kwargs):
+		start = time.perf_counter()
+		try:
+			return function(*args, **kwargs)
+		finally:
+			counter = _counter(name)
+			counter[0] += 1
+			counter[1] += time.perf_counter() - start
+	return counted
+
+def _counted_coercion(name, function, kind):
+	"""Count calls to function which have to convert their argument to kind, rather than it already being one."""
+	def counted(other):
+		if type(other) is kind:
+			return other
+		start = time.perf_counter()
+		try:
+			return function(other)
+		finally:
+			counter = _counter(name)
+			counter[0] += 1
+			counter[1] += time.perf_counter() - start
+	return counted
+
+def _counted_merge(name, function, rebuilds):
+	"""
+	Count calls to a merge of the pile or list other into a pile, with the bytes of cards it copies:
+	every card in both piles if it rebuilds the pile, else just other's cards.
+	"""
+	def counted(self, other, *args):
+		copied = len(other) + (len(self.cards) if rebuilds else 0)
+		copied *= 1 if isinstance(self.cards, CardArray) else _REFERENCE_SIZE
+
+		start = time.perf_counter()
+		try:
+			return function(self, other, *args)
+		finally:
+			counter = _counter(name)
+			counter[0] += 1
+			counter[1] += time.perf_counter() - start
+			counter[2] += copied
+	return counted
+
+def _instrumented():
+	"""Return (owner, attribute, wrapped function) for everything instrumentation counts."""
+	module = sys.modules[__name__]
+	wrapped = [
+		(PlayingCard, '_assign', _counted('PlayingCard construction', PlayingCard._assign)),
+		(PlayingCard, 'copy', _counted('PlayingCard.copy', PlayingCard.copy)),
+		(Number, '__new__', _counted('Number construction', Number.__new__)),
+		(Suit, '__new__', _counted('Suit construction', Suit.__new__)),
+		(module, '_as_number', _counted_coercion('Number coercion', _as_number, Number)),
+		(module, '_as_suit', _counted_coercion('Suit coercion', _as_suit, Suit)),
+		(Hand, 'value', _counted('Hand.value', Hand.value)),
+		(Pile, '__add__', _counted_merge('Pile.__add__', Pile.__add__, True)),
+		(Pile, '__iadd__', _counted_merge('Pile.__iadd__', Pile.__iadd__, True)),
+		(Deck, '__iadd__', _counted_merge('Deck.__iadd__', Deck.__iadd__, False)),
+		(Pile, 'extend_from', _counted_merge('Pile.extend_from', Pile.extend_from, False)),
+		(Deck, 'extend_from', _counted_merge('Deck.extend_from', Deck.extend_from, False)),
+	]
+	for owner, names in ((Pile, ('add', 'add_many')), (Deck, ('add', 'add_many', 'draw', 'draw_many', 'shuffle', 'deal'))):
+		for attribute in names:
+			wrapped.append((owner, attribute, _counted(owner.__name__ + '.' + attribute, vars(owner)[attribute])))
+	return wrapped
+
+def enable_instrumentation():
+	"""Start counting and timing card constructions, coercions, pile operations, Hand.value and merges."""
+	if _originals:
+		return
+	for owner, attribute, function in _instrumented():
+		_originals.append((owner, attribute, vars(owner)[attribute]))
+		setattr(owner, attribute, function)
+
+def disable_instrumentation():
+	"""Stop counting, putting the original functions back. The counters are kept."""
+	while _originals:
+		owner, attribute, original = _originals.pop()
+		setattr(owner, attribute, original)
+
+def instrumentation_enabled():
+	return bool(_originals)
+
+def counters():
+	"""Return a snapshot of the counters: a dict from each counted operation to its calls, seconds and bytes copied."""
+	return {name: {'calls': calls, 'seconds': seconds, 'bytes': copied}
+		for name, (calls, seconds, copied) in sorted(_counters.items())}
+
+def reset_counters():
+	_counters.clear()
+
+
+class instrument():
+	"""
+	A context manager which enables instrumentation for its block, giving a dict of what was counted in the block.
+
+		with cards.instrument() as counts:
+			...
+		print(counts['Deck.draw']['calls'])
+	"""
+
+	def __enter__(self):
+		self.was_enabled = instrumentation_enabled()
+		self.before = counters()
+		self.counts = {}
+		enable_instrumentation()
+		return self.counts
+
+	def __exit__(self, *exc_info):
+		if not self.was_enabled:
+			disable_instrumentation()
+
+		for name, after in counters().items():
+			before = self.before.get(name, {'calls': 0, 'seconds': 0.0, 'bytes': 0})
+			if after['calls'] != before['calls']:
+				self.counts[name] = {key: after[key] - before[key] for key in after}
+		return False
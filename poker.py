@@ -0,0 +1,339 @@
+import cards as c
+from array import array
+from collections import namedtuple
+from functools import lru_cache
+from itertools import combinations, permutations
+from math import comb, sqrt
+
+
+# Hand categories, from worst to best
+HIGH_CARD = 0
+PAIR = 1
+TWO_PAIR = 2
+THREE_OF_A_KIND = 3
+STRAIGHT = 4
+FLUSH = 5
+FULL_HOUSE = 6
+FOUR_OF_A_KIND = 7
+STRAIGHT_FLUSH = 8
+
+CATEGORY_NAMES = ('High Card', 'Pair', 'Two Pair', 'Three of a Kind', 'Straight', 'Flush', 'Full House',
+	'Four of a Kind', 'Straight Flush')
+
+
+# Hand values are the category in the high bits followed by up to five ranks of 4 bits each, most important first,
+# so comparing two values compares the hands. Ranks go from 0 for a Two up to 12 for an Ace.
+
+def _hand_value(category, ranks):
+	value = category
+	for i in range(5):
+		value = value << 4 | (ranks[i] + 1 if i < len(ranks) else 0)
+	return value
+
+def category(value):
+	"""Return the category of a hand value, e.g. FLUSH."""
+	return value >> 20
+
+def describe(value):
+	"""Return the name of the category of a hand value, e.g. 'Flush'."""
+	return CATEGORY_NAMES[category(value)]
+
+
+# The rank mask of every straight with the rank of its highest card, best first, ending with the wheel (Ace to Five)
+_STRAIGHTS = [(0x1F << (high - 4), high) for high in range(12, 3, -1)] + [(1 << 12 | 0xF, 3)]
+
+def _straight_high(mask):
+	"""Return the rank of the highest card of the best straight among the ranks set in mask, or None."""
+	for straight, high in _STRAIGHTS:
+		if mask & straight == straight:
+			return high
+	return None
+
+def _multiset_value(counts):
+	"""Return the value of the best hand, ignoring flushes, from counts[rank] cards of each rank."""
+	by_count = sorted([(count, rank) for rank, count in enumerate(counts) if count], reverse=True)
+	ranks = [rank for count, rank in by_count]
+	top = by_count[0][0]
+
+	if top == 4:
+		return _hand_value(FOUR_OF_A_KIND, [ranks[0]] + sorted(ranks[1:], reverse=True)[:1])
+	if top == 3 and len(by_count) > 1 and by_count[1][0] >= 2:
+		return _hand_value(FULL_HOUSE, ranks[:2])
+
+	high = _straight_high(sum([1 << rank for rank in ranks]))
+	if high is not None:
+		return _hand_value(STRAIGHT, [high])
+
+	if top == 3:
+		return _hand_value(THREE_OF_A_KIND, [ranks[0]] + sorted(ranks[1:], reverse=True)[:2])
+	if top == 2 and len(by_count) > 1 and by_count[1][0] == 2:
+		return _hand_value(TWO_PAIR, ranks[:2] + sorted(ranks[2:], reverse=True)[:1])
+	if top == 2:
+		return _hand_value(PAIR, [ranks[0]] + sorted(ranks[1:], reverse=True)[:3])
+	return _hand_value(HIGH_CARD, sorted(ranks, reverse=True)[:5])
+
+def _flush_value(mask):
+	"""Return the value of the best flush from the ranks set in the 13 bit mask, or 0 if there are under 5."""
+	ranks = [rank for rank in range(12, -1, -1) if mask >> rank & 1]
+	if len(ranks) < 5:
+		return 0
+
+	high = _straight_high(mask)
+	if high is not None:
+		return _hand_value(STRAIGHT_FLUSH, [high])
+	return _hand_value(FLUSH, ranks[:5])
+
+
+# Lookups indexed by a card's byte (see PlayingCard.to_byte()) so face down cards work too.
+# A card's rank key has a 1 in a block of 3 bits for its rank and in the hand size above them, so the sum of a hand's
+# keys counts how many cards it has of each rank without carrying from one rank to the next, and how many cards it has.
+# Its suit bit sits in a block of 16 bits for its suit, so or-ing them gives a rank mask for each suit.
+_JOKER_SHIFT = 39
+_SIZE_SHIFT = 42
+
+_RANK_KEY = [0] * 256
+_SUIT_BIT = [0] * 256
+for _byte in range(256):
+	_code = _byte & ~c.PlayingCard.FACE_DOWN_BIT
+	if _code < 52:
+		_rank = (_code % 13 - 1) % 13
+		_RANK_KEY[_byte] = 1 << 3 * _rank | 1 << _SIZE_SHIFT
+		_SUIT_BIT[_byte] = 1 << (16 * (_code // 13) + _rank)
+	else:
+		# Jokers can't be ranked, so they count as 8 cards, making any hand with one too big
+		_RANK_KEY[_byte] = 1 << _JOKER_SHIFT | 8 << _SIZE_SHIFT
+
+# The value of every flush by its suit's rank mask
+_FLUSHES = [_flush_value(mask) for mask in range(1 << 13)]
+
+def _fill_multisets(values, counts, rank, size, key):
+	if rank == 13:
+		if size:
+			values[key | size << _SIZE_SHIFT] = _multiset_value(counts)
+		return
+	for count in range(min(4, 7 - size) + 1):
+		counts[rank] = count
+		_fill_multisets(values, counts, rank + 1, size + count, key | count << 3 * rank)
+	counts[rank] = 0
+
+class _Multisets(dict):
+	"""
+	The value of every other hand of 1 to 7 cards with at most 4 of each rank by the sum of its rank keys.
+	Its 76,000 entries are only worked out the first time one is looked up, so importing stays fast.
+	"""
+
+	def __missing__(self, key):
+		if self:
+			raise KeyError(key)
+		_fill_multisets(self, [0] * 13, 0, 0, 0)
+		return self[key]
+
+_MULTISETS = _Multisets()
+
+def _unrankable(key, hand):
+	"""Return the ValueError for hand, whose rank keys sum to key, when it can't be ranked."""
+	if key >> _JOKER_SHIFT & 7:
+		return ValueError('Can\'t rank a hand with a Joker', hand)
+	if not 0 < key >> _SIZE_SHIFT <= 7:
+		return ValueError('Can only rank hands of 1 to 7 cards', hand)
+	return ValueError('Can\'t rank a hand with more than 4 cards of a rank', hand)
+
+
+def rank_codes(codes):
+	"""
+	Return the value of the best poker hand from 1 to 7 card codes or bytes. Higher values are better hands.
+	The same card can be given more than once, as from a multi-deck Shoe, but a ValueError is raised for a hand
+	with more than 4 cards of a rank, or with a Joker.
+	"""
+	key = 0
+	bits = 0
+	for code in codes:
+		key += _RANK_KEY[code]
+		bits |= _SUIT_BIT[code]
+	if not 0 < key >> _SIZE_SHIFT <= 7:
+		raise _unrankable(key, codes)
+
+	# A hand of 7 cards can't have a flush and also a full house or four of a kind
+	for shift in (0, 16, 32, 48):
+		flush = _FLUSHES[bits >> shift & 0x1FFF]
+		if flush:
+			return flush
+	try:
+		return _MULTISETS[key]
+	except KeyError:
+		raise _unrankable(key, codes) from None
+
+def rank_many(hands, size=None):
+	"""
+	Return an array of the value of each hand in hands in one pass.
+
+	hands is either an iterable of sequences of card codes, or when size is given, one flat sequence of codes
+	(like bytes, a DeckBatch row or a CardArray's codes) which is cut into hands of size cards each.
+	Hands follow the same rules as in rank_codes(), so hands from a multi-deck Shoe can hold the same card twice.
+	"""
+	rank_key, suit_bit, flushes, multisets = _RANK_KEY, _SUIT_BIT, _FLUSHES, _MULTISETS
+	if size is not None:
+		hands = [hands[i:i + size] for i in range(0, len(hands) - size + 1, size)]
+
+	values = array('L')
+	try:
+		for hand in hands:
+			key = 0
+			bits = 0
+			for code in hand:
+				key += rank_key[code]
+				bits |= suit_bit[code]
+			if not 0 < key >> _SIZE_SHIFT <= 7:
+				raise _unrankable(key, hand)
+
+			value = flushes[bits & 0x1FFF] or flushes[bits >> 16 & 0x1FFF] or flushes[bits >> 32 & 0x1FFF] or \
+				flushes[bits >> 48 & 0x1FFF] or multisets[key]
+			values.append(value)
+	except KeyError:
+		raise _unrankable(key, hand) from None
+
+	return values
+
+
+class PokerValue(c.IncrementalEvaluator):
+	"""
+	Values cards as the best poker hand among them, with Aces high (and low in an Ace to Five straight).
+	Its state is the sum of the cards' rank keys and the or of their suit bits, so removing one of two copies of the
+	same card from a hand isn't tracked exactly; value such hands without removing cards from them.
+	"""
+
+	def __call__(self, cards):
+		if isinstance(cards, c.Pile):
+			cards = cards.cards
+		if isinstance(cards, c.CardArray):
+			return rank_codes(cards.codes)
+		return rank_codes([card.code for card in cards])
+
+	def start(self):
+		return (0, 0)
+	def add(self, state, card):
+		return (state[0] + _RANK_KEY[card.code], state[1] | _SUIT_BIT[card.code])
+	def remove(self, state, card):
+		return (state[0] - _RANK_KEY[card.code], state[1] & ~_SUIT_BIT[card.code])
+	def value(self, state):
+		key, bits = state
+		if not 0 < key >> _SIZE_SHIFT <= 7:
+			raise _unrankable(key, state)
+		for shift in (0, 16, 32, 48):
+			flush = _FLUSHES[bits >> shift & 0x1FFF]
+			if flush:
+				return flush
+		try:
+			return _MULTISETS[key]
+		except KeyError:
+			raise _unrankable(key, state) from None
+
+hand_rank = PokerValue()
+
+
+
+# Equity
+
+Equity = namedtuple('Equity', ['win', 'tie', 'share'])
+Equity.__doc__ = """A player's chance of having the best hand alone, of tying for it, and their expected share of the pot."""
+
+# Every way of relabelling the four suits
+_SUIT_PERMUTATIONS = list(permutations(range(4)))
+
+def _codes(cards):
+	return tuple([card if isinstance(card, int) else card.code for card in cards])
+
+def _canonical(holes, board):
+	"""Return the same key for every spot which only differs from holes and board by which suit is which."""
+	keys = []
+	for perm in _SUIT_PERMUTATIONS:
+		relabel = [perm[code // 13] * 13 + code % 13 for code in range(52)]
+		keys.append((tuple([tuple(sorted([relabel[code] for code in hole])) for hole in holes]),
+			tuple(sorted([relabel[code] for code in board]))))
+	return min(keys)
+
+def equity(holes, board=(), exhaustive_limit=200000, target_error=0.0025, max_trials=1000000, seed=None):
+	"""
+	Return a list of each player's Equity in a hand of Texas Hold'em.
+
+	holes is each player's hole cards and board the cards dealt to the board so far, as PlayingCards, Hands or codes.
+	When there are at most exhaustive_limit ways to deal the rest of the board, every one of them is dealt and the
+	result is exact. Otherwise boards are dealt at random, from seed, until the standard error of every player's
+	share is at most target_error, or max_trials boards have been dealt.
+
+	Results are cached by the spot with its suits relabelled the same way for every spot which only differs by suits,
+	so asking again returns straight away.
+	"""
+	holes = [_codes(hole) for hole in holes]
+	board = _codes(board)
+
+	known = [code for hole in holes for code in hole] + list(board)
+	if len(set(known)) != len(known) or not all([0 <= code < 52 for code in known]):
+		raise ValueError('Cards must be different standard cards', known)
+	if len(board) > 5:
+		raise ValueError('The board has at most 5 cards', board)
+
+	return list(_equity(_canonical(holes, board), exhaustive_limit, target_error, max_trials, seed))
+
+@lru_cache(maxsize=1 << 16)
+def _equity(spot, exhaustive_limit, target_error, max_trials, seed):
+	holes, board = spot
+	players = len(holes)
+
+	deck = c.Deck(fill=True)
+	deck - c.Pile([c.PlayingCard.from_code(code) for code in sum(holes, board)])
+	remaining = [card.code for card in deck]
+
+	# Each player's rank key and suit bits for their hole cards and the board so far
+	starts = [(sum([_RANK_KEY[code] for code in hole + board]), sum([_SUIT_BIT[code] for code in hole + board]))
+		for hole in holes]
+	to_deal = 5 - len(board)
+
+	wins = [0] * players
+	ties = [0] * players
+	shares = [0.0] * players
+	squares = [0.0] * players
+	rank_key, suit_bit, flushes, multisets = _RANK_KEY, _SUIT_BIT, _FLUSHES, _MULTISETS
+
+	def deal(runout):
+		key = 0
+		bits = 0
+		for code in runout:
+			key += rank_key[code]
+			bits |= suit_bit[code]
+
+		values = []
+		for start_key, start_bits in starts:
+			hand_bits = bits | start_bits
+			values.append(flushes[hand_bits & 0x1FFF] or flushes[hand_bits >> 16 & 0x1FFF] or
+				flushes[hand_bits >> 32 & 0x1FFF] or flushes[hand_bits >> 48 & 0x1FFF] or multisets[key + start_key])
+
+		best = max(values)
+		winners = [i for i in range(players) if values[i] == best]
+		share = 1 / len(winners)
+		for i in winners:
+			if len(winners) == 1:
+				wins[i] += 1
+			else:
+				ties[i] += 1
+			shares[i] += share
+			squares[i] += share * share
+
+	if comb(len(remaining), to_deal) <= exhaustive_limit:
+		trials = 0
+		for runout in combinations(remaining, to_deal):
+			deal(runout)
+			trials += 1
+	else:
+		rng = c.make_rng(seed)
+		trials = 0
+		while trials < max_trials:
+			for i in range(min(1000, max_trials - trials)):
+				deal(rng.sample(remaining, to_deal))
+				trials += 1
+
+			errors = [sqrt(max(squares[i] / trials - (shares[i] / trials) ** 2, 0.0) / trials) for i in range(players)]
+			if max(errors) <= target_error:
+				break
+
+	return tuple([Equity(wins[i] / trials, ties[i] / trials, shares[i] / trials) for i in range(players)])
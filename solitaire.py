@@ -1,14 +1,26 @@
 import cards as c
 import os
+from collections import namedtuple
 
 def clear():
 	os.system('clear')
 
-class TableauColumn(c.Deck):
+class Stack(c.Deck):
+	"""A Deck which is indexed and iterated from the bottom card up, in the order it's laid out on the table."""
 
 	def __init__(self, cards=[]):
 		self.cards = list(cards)
 
+	def __iter__(self):
+		return iter(self.cards)
+	def __getitem__(self, item):
+		return self.cards[item]
+	def empty(self):
+		return c.Pile.empty(self)
+
+
+class TableauColumn(Stack):
+
 	def __repr__(self):
 		return '<TableauColumn cards:' + str(self.cards) + '>'
 
@@ -37,8 +49,10 @@ class TableauColumn(c.Deck):
 class Tableau():
 	MAX_CARD_STR = 17
 
-	def __init__(self, deck, col_count=7):
+	def __init__(self, deck=None, col_count=7):
 		self.cols = [TableauColumn() for i in range(col_count)]
+		if deck is None:
+			return
 
 		deck.shuffle()
 		deck.flip_face_down()
@@ -75,10 +89,7 @@ class Tableau():
 		return self.cols[item]
 
 
-class Foundation(c.Deck):
-
-	def __init__(self, cards=[]):
-		self.cards = list(cards)
+class Foundation(Stack):
 
 	def __str__(self):
 		if len(self) > 0:
@@ -102,7 +113,7 @@ class Foundation(c.Deck):
 		self.cards.append(cards[0])
 
 
-class Talon(c.Deck):
+class Talon(Stack):
 
 	def __str__(self):
 		if len(self.cards) > 0:
@@ -120,8 +131,8 @@ class Talon(c.Deck):
 
 class Table():
 
-	def __init__(self):
-		self.deck = c.Deck(fill=True)
+	def __init__(self, rng=None):
+		self.deck = c.Deck(fill=True, rng=rng)
 		self.tableau = Tableau(self.deck)
 		self.foundations = [Foundation() for i in range(4)]
 		self.talon = Talon()
@@ -138,134 +149,361 @@ class Table():
 
 		return string
 
+	@classmethod
+	def from_snapshot(cls, state, rng=None):
+		"""Return a new Table set up in the position state, which was returned by snapshot()."""
+		table = cls.__new__(cls)
+		table.deck = c.Deck(rng=rng)
+		table.tableau = Tableau(col_count=len(state) - 52 - 6)
+		table.foundations = [Foundation() for i in range(4)]
+		table.talon = Talon()
+		return restore(table, state)
+
+	@classmethod
+	def from_bytes(cls, data, rng=None):
+		"""Return a new Table from data, as returned by to_bytes(). data can be a memoryview, like a slice of an mmap."""
+		return cls.from_snapshot(data, rng)
+	def to_bytes(self):
+		"""Return the table as bytes, which is the same as its snapshot."""
+		return snapshot(self)
+
+	def won(self):
+		"""Return whether every foundation is full."""
+		return all([f.full() for f in self.foundations])
+
+
+
+# Engine
+
+# Where cards can come from and go to besides the tableau columns, which are given by their index
+STOCK = 'stock'
+TALON = 'talon'
+FOUNDATION = 'foundation'
+
+Move = namedtuple('Move', ['source', 'count', 'destination'])
+Move.__doc__ = """
+Moving count cards from source to destination. Sources are STOCK, TALON or a column index,
+and destinations are TALON (only from the STOCK), FOUNDATION or a column index.
+"""
+
+
+def legal_moves(table):
+	"""
+	Return a list of every legal Move on table.
+
+	Rather than trying every card against every pile, each column's face up run is matched against a lookup from
+	the (number, color) of card each column accepts, and each card against the card each foundation needs next.
+	"""
+	accepts = {}
+	for i, col in enumerate(table.tableau):
+		if len(col) == 0:
+			wanted = [(13, 'Red'), (13, 'Black')]
+		else:
+			bottom = col[-1]
+			wanted = [(int(bottom) - 1, 'Black' if bottom.color == 'Red' else 'Red')]
+		for key in wanted:
+			accepts.setdefault(key, []).append(i)
+
+	needs = set()
+	for f in table.foundations:
+		if len(f) == 0:
+			needs.update((1, suit) for suit in c.SUITS)
+		elif not f.full():
+			needs.add((int(f[-1]) + 1, f.suit()))
+
+	moves = []
+	if len(table.deck) > 0 or len(table.talon) > 0:
+		moves.append(Move(STOCK, 1, TALON))
+
+	if len(table.talon) > 0:
+		card = table.talon[-1]
+		if (int(card), card.suit) in needs:
+			moves.append(Move(TALON, 1, FOUNDATION))
+		for dest in accepts.get((int(card), card.color), ()):
+			moves.append(Move(TALON, 1, dest))
+
+	for i, col in enumerate(table.tableau):
+		if len(col) == 0:
+			continue
 
+		card = col[-1]
+		if (int(card), card.suit) in needs:
+			moves.append(Move(i, 1, FOUNDATION))
 
+		# Walk up the face up run, which is always a valid sequence
+		for count in range(1, len(col) + 1):
+			card = col[-count]
+			if not card.face_one_up:
+				break
+			for dest in accepts.get((int(card), card.color), ()):
+				if dest != i:
+					moves.append(Move(i, count, dest))
+
+	return moves
+
+def draw_from_stock(table):
+	"""
+	Turn the top card of the deck onto the talon, shuffling the talon back into the deck if the deck is empty.
+	Returns the talon's cards from before it was shuffled back, or None if it wasn't.
+	"""
+	recycled = None
+	if len(table.deck) == 0:
+		recycled = list(table.talon.cards)
+		table.deck += table.talon
+		table.deck.shuffle()
+
+	table.talon.add(table.deck.draw())
+	return recycled
+
+def apply(table, move, history=None):
+	"""
+	Make move on table, raising a ValueError if it isn't legal. Returns table.
+
+	If history is given, it's a list which what's needed to unmake the move is appended to, for undo().
+	This keeps references to the cards already on the table, so making and unmaking moves never copies any cards.
+	"""
+	source, count, destination = move
+
+	columns = range(len(table.tableau))
+	if not (source in (STOCK, TALON) or (isinstance(source, int) and source in columns)) or \
+		not (destination in (TALON, FOUNDATION) or (isinstance(destination, int) and destination in columns)) or \
+		(destination == TALON) != (source == STOCK):
+		raise ValueError('Illegal move', move)
+
+	if source == STOCK:
+		if destination != TALON or count != 1 or len(table.deck) + len(table.talon) == 0:
+			raise ValueError('Illegal move', move)
+		recycled = draw_from_stock(table)
+		if history is not None:
+			history.append((move, recycled))
+		return table
+
+	if source == TALON:
+		take_pile = table.talon
+		if count != 1:
+			raise ValueError('Illegal move', move)
+	else:
+		take_pile = table.tableau[source]
+		if count < 1 or count > len(take_pile) or not take_pile[-count].face_one_up or source == destination:
+			raise ValueError('Illegal move', move)
+	if len(take_pile) == 0:
+		raise ValueError('Illegal move', move)
+
+	card = take_pile[-count]
+	# Whether taking the cards turns over the card they were on
+	flipped = source != TALON and len(take_pile) > count and not take_pile[-count - 1].face_one_up
+
+	if destination == FOUNDATION:
+		for i, f in enumerate(table.foundations):
+			if count == 1 and f.can_place(card):
+				f.place(take_pile.draw())
+				if history is not None:
+					history.append((move, (i, flipped)))
+				return table
+	else:
+		place_pile = table.tableau[destination]
+		if place_pile.can_place(card):
+			place_pile.place(take_pile.draw(count))
+			if history is not None:
+				history.append((move, (None, flipped)))
+			return table
+
+	raise ValueError('Illegal move', move)
+
+def undo(table, history):
+	"""Unmake the last move made on table by apply() with history. Returns table."""
+	move, detail = history.pop()
+	source, count, destination = move
+
+	columns = range(len(table.tableau))
+	if not (source in (STOCK, TALON) or (isinstance(source, int) and source in columns)) or \
+		not (destination in (TALON, FOUNDATION) or (isinstance(destination, int) and destination in columns)) or \
+		(destination == TALON) != (source == STOCK):
+		raise ValueError('Illegal move', move)
+
+	if source == STOCK:
+		if detail is None:
+			table.deck.add(table.talon.cards.pop())
+		else:
+			table.deck.cards = []
+			table.talon.cards = detail
+		return table
+
+	foundation, flipped = detail
+	place_pile = table.foundations[foundation] if destination == FOUNDATION else table.tableau[destination]
+	cards = place_pile.cards[len(place_pile) - count:]
+	del place_pile.cards[len(place_pile) - count:]
+
+	if source == TALON:
+		table.talon.cards += cards
+	else:
+		take_pile = table.tableau[source]
+		if flipped:
+			take_pile[-1].flip_face_down()
+		take_pile.cards += cards
 
+	return table
 
-clear()
 
-print('Welcome to Big Solitaire!')
-print('Your goal is to fill the four foundations with cards from each suit')
-print('You must start with an ace and then add cards one higher on top')
 
-print('\nTo flip over a card onto the talon, enter 0 twice')
-print('Once to show that you want to move a card to the talon')
-print('Twice to show that you want to flip a new card on top of the talon')
+# Snapshots
 
-print('\nIf you enter an invalid move (like taking 4 cards from a column with only 3)')
-print('nothing will happen and you will be prompted again to choose what to do')
+# The size of the snapshot of a Table with 7 columns
+SNAPSHOT_SIZE = 6 + 7 + 52
 
-input('\nPress enter to begin...')
+def _piles(table):
+	return [table.deck, table.talon] + table.foundations + table.tableau.cols
 
+def snapshot(table):
+	"""
+	Return the position on table as an immutable bytes object, SNAPSHOT_SIZE long for the usual 7 columns.
 
-t = Table()
+	It starts with the number of cards in the deck, the talon, each foundation and each column, followed by
+	every card's byte (see PlayingCard.to_byte(), which holds whether it's face up) in that order, from the
+	bottom of each pile up.
+	"""
+	piles = _piles(table)
+	return bytes([len(pile) for pile in piles]) + bytes([card.to_byte() for pile in piles for card in pile.cards])
 
-while not all([f.full() for f in t.foundations]):
+def restore(table, state):
+	"""Put table back in the position state, which was returned by snapshot() of a table with as many columns. Returns table."""
+	piles = _piles(table)
+	start = len(piles)
+	for pile, count in zip(piles, state):
+		pile.cards = [c.PlayingCard.from_byte(byte) for byte in state[start:start + count]]
+		start += count
+
+	return table
+
+
+
+# Interactive game
+
+def main():
 	clear()
-	print(t)
 
-	# Which pile will they take from?
-	take_select = None
-	while take_select == None:
-		try:
-			take_select = int(input('0: Talon, 1-7: Tableau columns\nFrom what pile will you move cards: '))
-		except ValueError:
-			print('ValueError')
-			continue
+	print('Welcome to Big Solitaire!')
+	print('Your goal is to fill the four foundations with cards from each suit')
+	print('You must start with an ace and then add cards one higher on top')
 
-		if take_select > 7 or take_select < 0:
-			print('Invalid choice')
-			take_select = None
+	print('\nTo flip over a card onto the talon, enter 0 twice')
+	print('Once to show that you want to move a card to the talon')
+	print('Twice to show that you want to flip a new card on top of the talon')
+
+	print('\nIf you enter an invalid move (like taking 4 cards from a column with only 3)')
+	print('nothing will happen and you will be prompted again to choose what to do')
+
+	input('\nPress enter to begin...')
 
-	# How many cards will they take?
-	if take_select == 0:
-		if len(t.talon) == 0:
-			t.talon.add(t.deck.draw())
-			continue
 
-		number_select = None
-		while number_select == None:
+	t = Table()
+
+	while not t.won():
+		clear()
+		print(t)
+
+		# Which pile will they take from?
+		take_select = None
+		while take_select == None:
 			try:
-				number_select = int(input('Enter the number of cards you\'ll move: '))
+				take_select = int(input('0: Talon, 1-7: Tableau columns\nFrom what pile will you move cards: '))
 			except ValueError:
 				print('ValueError')
 				continue
 
-			if number_select < 0 or number_select > 1:
+			if take_select > 7 or take_select < 0:
 				print('Invalid choice')
-				number_select = None
+				take_select = None
 
-		if number_select == 0:
-			if len(t.deck) == 0:
-				t.deck += t.talon
-				t.deck.shuffle()
+		# How many cards will they take?
+		if take_select == 0:
+			if len(t.talon) == 0:
+				t.talon.add(t.deck.draw())
+				continue
 
-			t.talon.add(t.deck.draw())
-			continue
+			number_select = None
+			while number_select == None:
+				try:
+					number_select = int(input('Enter the number of cards you\'ll move: '))
+				except ValueError:
+					print('ValueError')
+					continue
 
-		card_to_move = t.talon[-1]
-		number_select = 1
-		take_pile = t.talon
-	else:
-		print()
+				if number_select < 0 or number_select > 1:
+					print('Invalid choice')
+					number_select = None
 
-		number_select = None
-		while number_select == None:
-			try:
-				number_select = int(input('Enter the number of cards you\'ll move: '))
-			except ValueError:
-				print('ValueError')
+			if number_select == 0:
+				draw_from_stock(t)
 				continue
 
-			if number_select < 1:
-				print('Invalid choice')
-				number_select = None
+			card_to_move = t.talon[-1]
+			number_select = 1
+			take_pile = t.talon
+		else:
+			print()
 
-			if number_select:
+			number_select = None
+			while number_select == None:
 				try:
-					take_pile = t.tableau[take_select-1]
-					card_to_move = take_pile[len(take_pile) - number_select]
-				except IndexError:
-					print('IndexError')
-					number_select = None
+					number_select = int(input('Enter the number of cards you\'ll move: '))
+				except ValueError:
+					print('ValueError')
+					continue
 
-				if card_to_move and not card_to_move.face_one_up:
+				if number_select < 1:
 					print('Invalid choice')
 					number_select = None
 
-	print()
+				if number_select:
+					try:
+						take_pile = t.tableau[take_select-1]
+						card_to_move = take_pile[len(take_pile) - number_select]
+					except IndexError:
+						print('IndexError')
+						number_select = None
 
-	# Where will they move the cards?
-	place_select = None
-	while place_select == None:
-		try:
-			place_select = int(input('0: Foundation, 1-7: Tableau columns\nWhere will you move cards: '))
-		except ValueError:
-			print('ValueError')
-			continue
+					if card_to_move and not card_to_move.face_one_up:
+						print('Invalid choice')
+						number_select = None
 
-		if place_select == 0 and number_select != 1:
-			print('Too many cards')
-			place_select = None
+		print()
 
-		if place_select < 0 or place_select > 7:
-			print('Invalid choice')
-			place_select = None
+		# Where will they move the cards?
+		place_select = None
+		while place_select == None:
+			try:
+				place_select = int(input('0: Foundation, 1-7: Tableau columns\nWhere will you move cards: '))
+			except ValueError:
+				print('ValueError')
+				continue
 
+			if place_select == 0 and number_select != 1:
+				print('Too many cards')
+				place_select = None
 
-	# Resolving their choices
-	if place_select == 0:
-		for f in t.foundations:
-			if f.can_place(card_to_move):
-				f.place(take_pile.draw())
-				break
-	else:
-		place_pile = t.tableau[place_select-1]
-		if place_pile.can_place(card_to_move):
-			place_pile.place(take_pile.draw(number_select))
+			if place_select < 0 or place_select > 7:
+				print('Invalid choice')
+				place_select = None
+
+
+		# Resolving their choices
+		if place_select == 0:
+			for f in t.foundations:
+				if f.can_place(card_to_move):
+					f.place(take_pile.draw())
+					break
+		else:
+			place_pile = t.tableau[place_select-1]
+			if place_pile.can_place(card_to_move):
+				place_pile.place(take_pile.draw(number_select))
+
+
+	clear()
+	print(t)
 
+	print('You\'ve won! Nice job!')
 
-clear()
-print(t)
 
-print('You\'ve won! Nice job!')
\ No newline at end of file
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,403 @@
+"""
+Decides whether deals of solitaire can be won by searching every line of play with every card known.
+
+The search doesn't work on a Table directly. It loads a snapshot of the Table into a few lists of card codes and makes
+and unmakes moves on them in place, keeping a Zobrist hash of the position up to date as it goes.
+
+Since cards are turned from the deck one at a time and the talon can be recycled as often as wanted,
+every card left in the deck or talon can be reached eventually, so the search treats them as one
+set of cards which can be played at any time.
+"""
+
+import json
+import os
+import random
+import sys
+import time
+from collections import OrderedDict, namedtuple
+from multiprocessing import Pool, cpu_count
+
+import cards as c
+import solitaire as s
+
+
+# Kinds of moves made by the search
+COLUMN_TO_FOUNDATION = 'column to foundation'
+STOCK_TO_FOUNDATION = 'stock to foundation'
+STOCK_TO_COLUMN = 'stock to column'
+COLUMN_TO_COLUMN = 'column to column'
+
+# The number, suit and whether it's red of each card code, and the other card of the same number and color
+_NUMBER = [code % 13 + 1 for code in range(52)]
+_SUIT = [code // 13 for code in range(52)]
+_RED = [c.SUITS[code // 13].get_color() == 'Red' for code in range(52)]
+_TWIN = [(code + 26) % 52 for code in range(52)]
+_OPPOSITE_SUITS = [[suit for suit in range(4) if suit % 2 != code // 13 % 2] for code in range(52)]
+
+# What a column's bottom card sits on in the hash, in place of the code of the card under it
+_BASE = 52
+
+
+SolveResult = namedtuple('SolveResult', ['won', 'moves', 'nodes', 'seconds'])
+SolveResult.__doc__ = """
+The outcome of solving a deal. won is True or False, or None if the search ran out of budget.
+moves is the winning line of play when won is True, else None. Each move is a tuple starting with its kind:
+(COLUMN_TO_FOUNDATION, column, code), (STOCK_TO_FOUNDATION, code), (STOCK_TO_COLUMN, code, column) or
+(COLUMN_TO_COLUMN, column, count, column). nodes is the number of positions searched.
+"""
+
+
+class Solver():
+	"""
+	A depth first solitaire solver with a bounded transposition table.
+
+	Moves are tried best first: safe moves to the foundations are made without trying anything else, then moves
+	which turn over face down cards are tried before the rest. Positions which have already been searched are
+	skipped by looking up their Zobrist hash in a transposition table of at most table_size positions, which
+	evicts the least recently seen positions first. Each card in a column is hashed by the card it sits on (or the
+	column's base) and whether it's face up, which pins down every column's contents without depending on which
+	column it is, and only the first empty column is ever moved to, so positions which only differ by the order of
+	the columns are only searched once.
+
+	Attributes:
+		max_nodes (int): The most positions to search before giving up, or None.
+		time_limit (float): The most seconds to search for before giving up, or None.
+		table_size (int): The most positions kept in the transposition table.
+	"""
+
+	def __init__(self, max_nodes=1000000, time_limit=None, table_size=1 << 20, seed=0):
+		self.max_nodes = max_nodes
+		self.time_limit = time_limit
+		self.table_size = table_size
+
+		rng = random.Random(seed)
+		self._column_keys = [[[rng.getrandbits(64) for up in range(2)] for below in range(_BASE + 1)]
+			for code in range(52)]
+		self._foundation_keys = [[rng.getrandbits(64) for height in range(14)] for suit in range(4)]
+		self._stock_keys = [rng.getrandbits(64) for code in range(52)]
+
+	def __repr__(self):
+		return '<Solver max_nodes:' + str(self.max_nodes) + ', time_limit:' + str(self.time_limit) + \
+			', table_size:' + str(self.table_size) + '>'
+
+	def solve(self, table):
+		"""Search the position on table, which is left untouched, or on a snapshot of one, and return a SolveResult."""
+		self._load(table)
+		start = time.perf_counter()
+		nodes = 0
+
+		if self._won():
+			return SolveResult(True, [], nodes, time.perf_counter() - start)
+
+		seen = OrderedDict()
+		seen[self.hash] = None
+		path = []
+		pending = [iter(self._moves())]
+
+		while pending:
+			move = next(pending[-1], None)
+			if move is None:
+				pending.pop()
+				if path:
+					path.pop()
+					self._unmake()
+				continue
+
+			self._make(move)
+			nodes += 1
+
+			if self._won():
+				path.append(move)
+				return SolveResult(True, path, nodes, time.perf_counter() - start)
+			if self.max_nodes is not None and nodes >= self.max_nodes:
+				return SolveResult(None, None, nodes, time.perf_counter() - start)
+			if self.time_limit is not None and nodes % 1024 == 0 and time.perf_counter() - start > self.time_limit:
+				return SolveResult(None, None, nodes, time.perf_counter() - start)
+
+			if self.hash in seen:
+				seen.move_to_end(self.hash)
+				self._unmake()
+				continue
+
+			seen[self.hash] = None
+			if len(seen) > self.table_size:
+				seen.popitem(last=False)
+
+			path.append(move)
+			pending.append(iter(self._moves()))
+
+		return SolveResult(False, None, nodes, time.perf_counter() - start)
+
+	def _load(self, table):
+		"""Set up the search's position and hash from table, or a snapshot of one."""
+		state = s.snapshot(table) if isinstance(table, s.Table) else bytes(table)
+		counts = state[:len(state) - 52]
+		codes = state[len(counts):]
+		down_bit = c.PlayingCard.FACE_DOWN_BIT
+
+		piles = []
+		start = 0
+		for count in counts:
+			piles.append(codes[start:start + count])
+			start += count
+
+		self.stock = {byte & ~down_bit for byte in piles[0] + piles[1]}
+
+		self.heights = [0] * 4
+		for pile in piles[2:6]:
+			if pile:
+				self.heights[_SUIT[pile[0] & ~down_bit]] = len(pile)
+
+		self.cols = [[byte & ~down_bit for byte in pile] for pile in piles[6:]]
+		self.down = [len([byte for byte in pile if byte & down_bit]) for pile in piles[6:]]
+		self.undo = []
+
+		self.hash = 0
+		for cards, down in zip(self.cols, self.down):
+			for pos, code in enumerate(cards):
+				self.hash ^= self._column_keys[code][cards[pos - 1] if pos else _BASE][pos >= down]
+		for suit, height in enumerate(self.heights):
+			self.hash ^= self._foundation_keys[suit][height]
+		for code in self.stock:
+			self.hash ^= self._stock_keys[code]
+
+	def _won(self):
+		return sum(self.heights) == 52
+
+	def _safe(self, code):
+		"""Return whether playing code to its foundation can't lose anything: no card left could be put on it."""
+		return all([self.heights[suit] >= _NUMBER[code] - 1 for suit in _OPPOSITE_SUITS[code]])
+
+	def _available(self, code):
+		"""Return whether code is in the stock or face up in a column."""
+		if code in self.stock:
+			return True
+		for cards, down in zip(self.cols, self.down):
+			if code in cards[down:]:
+				return True
+		return False
+
+	def _moves(self):
+		"""Return the moves from the current position, best first, or just a safe foundation move if there is one."""
+		cols, down, heights = self.cols, self.down, self.heights
+
+		for i, cards in enumerate(cols):
+			if cards and _NUMBER[cards[-1]] == heights[_SUIT[cards[-1]]] + 1 and self._safe(cards[-1]):
+				return [(COLUMN_TO_FOUNDATION, i, cards[-1])]
+		for code in self.stock:
+			if _NUMBER[code] == heights[_SUIT[code]] + 1 and self._safe(code):
+				return [(STOCK_TO_FOUNDATION, code)]
+
+		# Which columns take a card of each (number, red), with only the first empty column taking Kings
+		accepts = {}
+		empty = None
+		for i, cards in enumerate(cols):
+			if cards:
+				accepts.setdefault((_NUMBER[cards[-1]] - 1, not _RED[cards[-1]]), []).append(i)
+			elif empty is None:
+				empty = i
+		if empty is not None:
+			accepts[(13, True)] = accepts[(13, False)] = [empty]
+
+		uncovering = []
+		to_foundation = []
+		from_stock = []
+		others = []
+		for i, cards in enumerate(cols):
+			if not cards:
+				continue
+
+			if _NUMBER[cards[-1]] == heights[_SUIT[cards[-1]]] + 1:
+				(uncovering if len(cards) - 1 == down[i] and down[i] else to_foundation).append(
+					(COLUMN_TO_FOUNDATION, i, cards[-1]))
+
+			for pos in range(down[i], len(cards)):
+				code = cards[pos]
+				# Moving a King which is already at the back of its column gets nowhere
+				if pos == 0 and _NUMBER[code] == 13:
+					continue
+				# Moving part of a run is only worth it to play the card it uncovers, or to put the card's twin there
+				if pos > down[i] and _NUMBER[cards[pos - 1]] != heights[_SUIT[cards[pos - 1]]] + 1 and \
+					not self._available(_TWIN[code]):
+					continue
+				for dest in accepts.get((_NUMBER[code], _RED[code]), ()):
+					if dest != i:
+						(uncovering if pos == down[i] and down[i] else others).append(
+							(COLUMN_TO_COLUMN, i, len(cards) - pos, dest))
+
+		for code in self.stock:
+			if _NUMBER[code] == heights[_SUIT[code]] + 1:
+				to_foundation.append((STOCK_TO_FOUNDATION, code))
+			for dest in accepts.get((_NUMBER[code], _RED[code]), ()):
+				from_stock.append((STOCK_TO_COLUMN, code, dest))
+
+		# Uncover the columns with the most face down cards first
+		uncovering.sort(key=lambda move: -down[move[1]])
+		return uncovering + to_foundation + from_stock + others
+
+	def _uncover(self, col):
+		"""Turn over the last card of col if it's face down, returning whether it was."""
+		cards = self.cols[col]
+		if cards and self.down[col] == len(cards):
+			self.down[col] -= 1
+			keys = self._column_keys[cards[-1]][cards[-2] if len(cards) > 1 else _BASE]
+			self.hash ^= keys[0] ^ keys[1]
+			return True
+		return False
+
+	def _to_foundation(self, code):
+		suit = _SUIT[code]
+		self.hash ^= self._foundation_keys[suit][self.heights[suit]]
+		self.heights[suit] += 1
+		self.hash ^= self._foundation_keys[suit][self.heights[suit]]
+	def _from_foundation(self, suit):
+		"""Take the top card off suit's foundation. The hash is left for _unmake to restore."""
+		self.heights[suit] -= 1
+
+	def _make(self, move):
+		"""Make move, pushing what's needed to unmake it onto self.undo."""
+		old_hash = self.hash
+		kind = move[0]
+		uncovered = False
+
+		if kind == COLUMN_TO_FOUNDATION:
+			cards = self.cols[move[1]]
+			code = cards.pop()
+			self.hash ^= self._column_keys[code][cards[-1] if cards else _BASE][1]
+			self._to_foundation(code)
+			uncovered = self._uncover(move[1])
+		elif kind == STOCK_TO_FOUNDATION:
+			self.stock.remove(move[1])
+			self.hash ^= self._stock_keys[move[1]]
+			self._to_foundation(move[1])
+		elif kind == STOCK_TO_COLUMN:
+			code, dest = move[1], move[2]
+			self.stock.remove(code)
+			self.hash ^= self._stock_keys[code]
+			target = self.cols[dest]
+			self.hash ^= self._column_keys[code][target[-1] if target else _BASE][1]
+			target.append(code)
+		else:
+			src, count, dest = move[1], move[2], move[3]
+			source, target = self.cols[src], self.cols[dest]
+			start = len(source) - count
+			# Only the bottom card of the run moves onto a different card
+			keys = self._column_keys[source[start]]
+			self.hash ^= keys[source[start - 1] if start else _BASE][1] ^ keys[target[-1] if target else _BASE][1]
+			target.extend(source[start:])
+			del source[start:]
+			uncovered = self._uncover(src)
+
+		self.undo.append((move, uncovered, old_hash))
+
+	def _unmake(self):
+		"""Unmake the last move made."""
+		move, uncovered, old_hash = self.undo.pop()
+		kind = move[0]
+
+		if kind == COLUMN_TO_FOUNDATION:
+			if uncovered:
+				self.down[move[1]] += 1
+			self._from_foundation(_SUIT[move[2]])
+			self.cols[move[1]].append(move[2])
+		elif kind == STOCK_TO_FOUNDATION:
+			self._from_foundation(_SUIT[move[1]])
+			self.stock.add(move[1])
+		elif kind == STOCK_TO_COLUMN:
+			self.cols[move[2]].pop()
+			self.stock.add(move[1])
+		else:
+			src, count, dest = move[1], move[2], move[3]
+			if uncovered:
+				self.down[src] += 1
+			target = self.cols[dest]
+			self.cols[src].extend(target[len(target) - count:])
+			del target[len(target) - count:]
+
+		self.hash = old_hash
+
+
+def solve(table, max_nodes=1000000, time_limit=None, table_size=1 << 20):
+	"""Return a SolveResult for the position on table using a new Solver."""
+	return Solver(max_nodes, time_limit, table_size).solve(table)
+
+
+
+# Surveys
+
+# The Solver each worker process reuses between deals, along with the budgets it was made with
+_worker_solver = None
+
+def _survey_seed(args):
+	"""Deal the Table for seed and solve it, returning a record of how it went. Run by the survey's workers."""
+	global _worker_solver
+	seed, max_nodes, time_limit, table_size = args
+
+	if _worker_solver is None or (_worker_solver.max_nodes, _worker_solver.time_limit, _worker_solver.table_size) != \
+		(max_nodes, time_limit, table_size):
+		_worker_solver = Solver(max_nodes, time_limit, table_size)
+
+	result = _worker_solver.solve(s.Table(rng=seed))
+	return {'seed': seed, 'won': result.won, 'moves': len(result.moves) if result.moves is not None else None,
+		'nodes': result.nodes, 'seconds': round(result.seconds, 6)}
+
+def read_survey(path):
+	"""Yield the record of every deal in the survey results file at path, skipping any line left unfinished."""
+	if not os.path.exists(path):
+		return
+
+	with open(path) as results:
+		for line in results:
+			try:
+				yield json.loads(line)
+			except ValueError:
+				continue
+
+def survey(seeds, path, workers=None, max_nodes=1000000, time_limit=None, table_size=1 << 20):
+	"""
+	Solve the deal of Table(rng=seed) for every seed in seeds across a pool of worker processes,
+	appending a line of JSON for each to the results file at path as it finishes. Returns how many deals were surveyed.
+
+	Seeds which already have a record in path are skipped, so a survey which was stopped carries on where it left off
+	when run again. Deals are handed out one at a time to whichever worker is free, so a few hard deals don't
+	hold up the rest. workers defaults to the number of CPUs.
+	"""
+	if workers is None:
+		workers = cpu_count()
+
+	done = {record['seed'] for record in read_survey(path)}
+	tasks = ((seed, max_nodes, time_limit, table_size) for seed in seeds if seed not in done)
+
+	with open(path, 'a+') as results:
+		# Finish off a line cut short by an interruption
+		if results.tell() > 0:
+			results.seek(results.tell() - 1)
+			if results.read(1) != '\n':
+				results.write('\n')
+
+		count = 0
+		if workers == 1:
+			records = map(_survey_seed, tasks)
+			pool = None
+		else:
+			pool = Pool(workers)
+			records = pool.imap_unordered(_survey_seed, tasks, chunksize=1)
+
+		try:
+			for record in records:
+				results.write(json.dumps(record) + '\n')
+				results.flush()
+				count += 1
+		finally:
+			if pool is not None:
+				pool.terminate()
+
+	return count
+
+
+if __name__ == '__main__':
+	# python solitaire_solver.py first_seed last_seed results_file [max_nodes]
+	first, last, path = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3]
+	max_nodes = int(sys.argv[4]) if len(sys.argv) > 4 else 1000000
+
+	print('Surveyed ' + str(survey(range(first, last + 1), path, max_nodes=max_nodes)) + ' deals')
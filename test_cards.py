@@ -0,0 +1,71 @@
+import pytest
+
+import cards as c
+
+
+def assert_counts_match(shoe):
+	counts = [0] * 14
+	for card in shoe:
+		counts[int(card)] += 1
+	assert shoe.composition() == tuple(counts)
+	assert sum(shoe.composition()) == len(shoe)
+
+
+def test_shoe_counts_follow_removed_cards():
+	for compact in (False, True):
+		shoe = c.Shoe(2, compact=compact, rng=1)
+		shoe.remove(c.PlayingCard('King', 'Spade'))
+		assert len(shoe) == 103
+		assert_counts_match(shoe)
+
+def test_shoe_operators_build_shoes():
+	for compact in (False, True):
+		shoe = c.Shoe(2, compact=compact, rng=1)
+		known = c.Pile([c.PlayingCard('Ace', 'Spade'), c.PlayingCard(7, 'Heart')])
+
+		removed = shoe - known
+		assert isinstance(removed, c.Shoe) and len(removed) == 2 and len(shoe) == 102
+		assert_counts_match(shoe)
+		assert_counts_match(removed)
+
+		joined = shoe + c.Deck(fill=True)
+		assert isinstance(joined, c.Shoe) and len(joined) == 154
+		assert_counts_match(joined)
+
+class RunningSum(c.IncrementalEvaluator):
+	def start(self):
+		return 0
+	def add(self, state, card):
+		return state + int(card)
+	def remove(self, state, card):
+		return state - int(card)
+
+def test_hand_value_ignores_duplicate_adds():
+	for compact in (False, True):
+		hand = c.Hand([], evaluate=RunningSum(), compact=compact)
+		hand.add(c.PlayingCard('King', 'Spade'))
+		hand.value()
+		hand.add(c.PlayingCard('King', 'Spade'))
+		assert len(hand) == 1
+		assert hand.value() == c.Hand.hand_sum(hand)
+
+def test_equal_cards_hash_equal():
+	card = c.Card('Ace of Spades', 'Back')
+	playing_card = c.PlayingCard('Ace', 'Spade')
+	assert card != playing_card and playing_card != card
+	assert len({card, playing_card}) == 2
+
+	flipped = c.PlayingCard('Ace', 'Spade')
+	flipped.flip()
+	assert flipped == playing_card and hash(flipped) == hash(playing_card)
+
+def test_serialization_errors_are_value_errors():
+	stored = c.Deck(fill=True).to_bytes()
+	with pytest.raises(ValueError):
+		list(c.iter_records(bytes([len(c._KINDS)]) + stored[1:]))
+	with pytest.raises(ValueError):
+		list(c.iter_records(stored[:-1]))
+	with pytest.raises(ValueError):
+		c.Deck(list(c.Deck(fill=True)) * 1261).to_bytes()
+	with pytest.raises(ValueError):
+		c.Hand([], notes='x' * 70000).to_bytes()
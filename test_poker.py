@@ -0,0 +1,95 @@
+import random
+from itertools import combinations
+
+import pytest
+
+import cards as c
+import poker
+
+
+def reference_five(codes):
+	"""Value 5 card codes directly, in the same encoding as poker's hand values."""
+	ranks = sorted([(code % 13 - 1) % 13 for code in codes], reverse=True)
+	flush = len({code // 13 for code in codes}) == 1
+
+	distinct = sorted(set(ranks), reverse=True)
+	straight = None
+	if len(distinct) == 5 and distinct[0] - distinct[4] == 4:
+		straight = distinct[0]
+	elif distinct == [12, 3, 2, 1, 0]:
+		straight = 3
+
+	groups = sorted([(ranks.count(rank), rank) for rank in distinct], reverse=True)
+	shape = [count for count, rank in groups]
+	by_group = [rank for count, rank in groups]
+
+	if straight is not None and flush:
+		return poker._hand_value(poker.STRAIGHT_FLUSH, [straight])
+	if shape == [4, 1]:
+		return poker._hand_value(poker.FOUR_OF_A_KIND, by_group)
+	if shape == [3, 2]:
+		return poker._hand_value(poker.FULL_HOUSE, by_group)
+	if flush:
+		return poker._hand_value(poker.FLUSH, ranks)
+	if straight is not None:
+		return poker._hand_value(poker.STRAIGHT, [straight])
+	if shape == [3, 1, 1]:
+		return poker._hand_value(poker.THREE_OF_A_KIND, by_group)
+	if shape == [2, 2, 1]:
+		return poker._hand_value(poker.TWO_PAIR, by_group)
+	if shape == [2, 1, 1, 1]:
+		return poker._hand_value(poker.PAIR, by_group)
+	return poker._hand_value(poker.HIGH_CARD, ranks)
+
+def reference(codes):
+	return max([reference_five(five) for five in combinations(codes, 5)])
+
+
+def test_matches_brute_force_on_random_hands():
+	rng = random.Random(1)
+	for size in (5, 6, 7):
+		hands = [rng.sample(range(52), size) for i in range(1000)]
+		assert list(poker.rank_many(hands)) == [reference(hand) for hand in hands]
+		assert [poker.rank_codes(hand) for hand in hands[:100]] == [reference(hand) for hand in hands[:100]]
+
+def test_incremental_value_matches():
+	rng = random.Random(2)
+	hand = c.Hand([], evaluate=poker.hand_rank)
+	for code in rng.sample(range(52), 7):
+		hand.add(c.PlayingCard.from_code(code))
+		if len(hand) >= 5:
+			assert hand.value() == reference([card.code for card in hand])
+
+def test_jokers_raise_value_error():
+	with pytest.raises(ValueError, match='Joker'):
+		poker.rank_codes([0, 1, 2, 3, 52])
+	with pytest.raises(ValueError, match='Joker'):
+		poker.rank_many([[0, 1, 2, 3, 53]])
+
+def codes(*cards):
+	return [c.PlayingCard(number, suit).code for number, suit in cards]
+
+@pytest.mark.parametrize('hand', [
+	[],
+	codes(('Ace', 'Heart'), ('King', 'Heart'), ('Queen', 'Heart'), ('Jack', 'Heart'), (9, 'Heart'), ('Ace', 'Club'),
+		('Ace', 'Diamond'), ('Ace', 'Spade')),
+	codes((2, 'Heart'), (2, 'Club'), (2, 'Diamond'), (2, 'Spade'), (2, 'Heart'), (5, 'Heart'), (7, 'Heart')),
+	codes(('Ace', 'Heart'), ('King', 'Heart'), ('Queen', 'Heart'), ('Jack', 'Heart'), (9, 'Heart')) + [52],
+])
+def test_unrankable_hands_raise_value_error(hand):
+	with pytest.raises(ValueError):
+		poker.rank_codes(hand)
+	with pytest.raises(ValueError):
+		poker.rank_many([hand])
+	if hand:
+		incremental = c.OrderedHand([], evaluate=poker.hand_rank)
+		incremental.add(c.PlayingCard.from_code(hand[0]))
+		incremental.value()
+		for code in hand[1:]:
+			incremental.add(c.PlayingCard.from_code(code))
+		with pytest.raises(ValueError):
+			incremental.value()
+
+def test_same_card_twice_counts_twice():
+	hand = codes((2, 'Heart'), (2, 'Heart'), (5, 'Club'), (7, 'Diamond'), (9, 'Spade'))
+	assert poker.category(poker.rank_codes(hand)) == poker.PAIR
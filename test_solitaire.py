@@ -0,0 +1,42 @@
+import pytest
+
+import cards as c
+import solitaire as s
+import solitaire_solver
+
+
+@pytest.mark.parametrize('move', [s.Move(0, 1, s.TALON), s.Move(0, 1, 7), s.Move(7, 1, 0), s.Move(-1, 1, 0),
+	s.Move(s.TALON, 1, s.TALON), s.Move(s.STOCK, 1, 0), s.Move('column', 1, 0)])
+def test_apply_rejects_illegal_moves(move):
+	table = s.Table(rng=1)
+	with pytest.raises(ValueError):
+		s.apply(table, move)
+
+def test_solver_takes_snapshots_in_any_buffer():
+	table = s.Table(rng=2)
+	snapshot = s.snapshot(table)
+	results = [solitaire_solver.solve(state).won for state in (table, snapshot, bytearray(snapshot), memoryview(snapshot))]
+	assert len(set(results)) == 1
+
+def _two_column_position(first, second):
+	"""Return a snapshot with two columns, the rest of the cards on the foundations or in the stock, given as (suit, number)s."""
+	def code(suit, number):
+		return suit * 13 + number - 1
+	hearts, clubs, diamonds, spades = range(4)
+	down = c.PlayingCard.FACE_DOWN_BIT
+
+	stock = [code(hearts, n) for n in range(9, 14)] + [code(clubs, n) for n in range(10, 14)] + \
+		[code(spades, n) for n in range(10, 14)]
+	foundations = [[code(spades, n) for n in range(1, 9)], [code(hearts, n) for n in range(1, 7)],
+		[code(clubs, n) for n in range(1, 8)], [code(diamonds, n) for n in range(1, 14)]]
+	columns = [[code(*card) | (down if i == 0 else 0) for i, card in enumerate(column)] for column in (first, second)]
+
+	piles = [stock, []] + foundations + columns
+	return bytes([len(pile) for pile in piles]) + bytes([byte for pile in piles for byte in pile])
+
+def test_solver_keeps_positions_apart_which_only_differ_by_what_a_card_is_on():
+	# The Eight of Hearts on the Nine of Spades, or moved onto the Nine of Clubs at the same depth
+	before = _two_column_position([(0, 7), (3, 9), (0, 8)], [(1, 8), (1, 9)])
+	after = _two_column_position([(0, 7), (3, 9)], [(1, 8), (1, 9), (0, 8)])
+	assert solitaire_solver.solve(after).won is True
+	assert solitaire_solver.solve(before).won is True